@@ -0,0 +1,206 @@
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+SRC_DIR = Path(__file__).resolve().parent.parent / "src"
+PASSWORD = "bench-password"
+PROXY_ADDR = "10.0.0.1"
+
+
+def _percentile(values: list[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def _latency_summary(values: list[float]) -> dict[str, float]:
+    return {
+        "p50_ms": _percentile(values, 0.50) * 1000,
+        "p99_ms": _percentile(values, 0.99) * 1000,
+        "max_ms": max(values, default=0.0) * 1000,
+        "mean_ms": statistics.fmean(values) * 1000 if values else 0.0,
+    }
+
+
+def _create_app(data_dir: str, password_hash: str, args: argparse.Namespace):
+    os.environ.update(
+        {
+            "APP_ENV": "local",
+            "DATA_DIR": data_dir,
+            "HABIT_LOG_DB_PATH": str(Path(data_dir) / "habit-log.db"),
+            "HABIT_LOG_PASSWORD_HASH": password_hash,
+            "HABIT_LOG_SECRET_KEY": "bench",
+            "HABIT_LOG_LOGIN_CONCURRENCY": str(args.login_concurrency),
+            "HABIT_LOG_LOGIN_MAX_FAILURES": str(args.max_failures),
+            "HABIT_LOG_TRUSTED_PROXIES": str(args.trusted_proxies),
+        }
+    )
+    if args.login_queue is None:
+        os.environ.pop("HABIT_LOG_LOGIN_QUEUE", None)
+    else:
+        os.environ["HABIT_LOG_LOGIN_QUEUE"] = str(args.login_queue)
+    os.environ.pop("HABIT_LOG_MULTI_USER", None)
+    sys.path.insert(0, str(SRC_DIR))
+    from habit_log.app import create_app
+    from habit_log.config import reload_settings
+
+    reload_settings()
+    app = create_app()
+    app.config["TESTING"] = True
+    return app
+
+
+def _login_worker(
+    app,
+    attempts: int,
+    wrong_every: int,
+    client_id: int,
+    forwarded: bool,
+    statuses: Counter,
+    latencies: list[float],
+    lock: threading.Lock,
+) -> None:
+    client = app.test_client()
+    # Every request arrives from the reverse proxy; the real client address is
+    # only visible in X-Forwarded-For, and only trusted with --trusted-proxies.
+    headers = {}
+    if forwarded:
+        headers["X-Forwarded-For"] = f"192.0.2.{client_id % 256}"
+    local_statuses: Counter = Counter()
+    local_latencies = []
+    for attempt in range(attempts):
+        wrong = wrong_every and attempt % wrong_every == wrong_every - 1
+        started = time.perf_counter()
+        response = client.post(
+            "/login",
+            data={"password": "wrong" if wrong else PASSWORD, "next": "/"},
+            headers=headers,
+            environ_base={"REMOTE_ADDR": PROXY_ADDR},
+        )
+        local_latencies.append(time.perf_counter() - started)
+        local_statuses[response.status_code] += 1
+    with lock:
+        statuses.update(local_statuses)
+        latencies.extend(local_latencies)
+
+
+def _health_probe(app, stop: threading.Event, latencies: list[float]) -> None:
+    client = app.test_client()
+    while not stop.is_set():
+        started = time.perf_counter()
+        client.get("/health", environ_base={"REMOTE_ADDR": PROXY_ADDR})
+        latencies.append(time.perf_counter() - started)
+        time.sleep(0.005)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Measure login throughput under concurrent attempts."
+    )
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--attempts", type=int, default=10, help="Per client.")
+    parser.add_argument(
+        "--wrong-every",
+        type=int,
+        default=0,
+        help="Make every Nth attempt use a wrong password (0: never).",
+    )
+    parser.add_argument(
+        "--hash-method",
+        default="scrypt",
+        help="werkzeug hash method for the benchmark password (default: scrypt).",
+    )
+    parser.add_argument("--login-concurrency", type=int, default=2)
+    parser.add_argument(
+        "--login-queue",
+        type=int,
+        default=None,
+        help="Override HABIT_LOG_LOGIN_QUEUE (default: derived from threads).",
+    )
+    parser.add_argument(
+        "--trusted-proxies",
+        type=int,
+        default=0,
+        help="Send X-Forwarded-For per client and trust this many proxies.",
+    )
+    parser.add_argument("--max-failures", type=int, default=5)
+    parser.add_argument("--output", type=Path, default=None)
+    args = parser.parse_args()
+
+    from werkzeug.security import generate_password_hash
+
+    password_hash = generate_password_hash(PASSWORD, method=args.hash_method)
+    with tempfile.TemporaryDirectory() as data_dir:
+        app = _create_app(data_dir, password_hash, args)
+        statuses: Counter = Counter()
+        latencies: list[float] = []
+        health_latencies: list[float] = []
+        lock = threading.Lock()
+        stop = threading.Event()
+        probe = threading.Thread(
+            target=_health_probe, args=(app, stop, health_latencies)
+        )
+        workers = [
+            threading.Thread(
+                target=_login_worker,
+                args=(
+                    app,
+                    args.attempts,
+                    args.wrong_every,
+                    client_id,
+                    args.trusted_proxies > 0,
+                    statuses,
+                    latencies,
+                    lock,
+                ),
+            )
+            for client_id in range(args.clients)
+        ]
+
+        probe.start()
+        started = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - started
+        stop.set()
+        probe.join()
+        guard = app.extensions["habit_log_login"]["verifier"].stats()
+
+    total = sum(statuses.values())
+    report = {
+        "benchmark": "login",
+        "python": sys.version.split()[0],
+        "hash_method": args.hash_method,
+        "clients": args.clients,
+        "trusted_proxies": args.trusted_proxies,
+        "attempts": total,
+        "elapsed_seconds": elapsed,
+        "attempts_per_second": total / elapsed if elapsed else None,
+        "logins_per_second": statuses[302] / elapsed if elapsed else None,
+        "statuses": {str(status): count for status, count in sorted(statuses.items())},
+        "login_latency": _latency_summary(latencies),
+        "health_latency_during_burst": _latency_summary(health_latencies),
+        "verifier": guard,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(output + "\n", encoding="utf-8")
+    print(output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,392 @@
+from __future__ import annotations
+
+import argparse
+import datetime as dt
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Callable
+
+SRC_DIR = Path(__file__).resolve().parent.parent / "src"
+PASSWORD = "bench-password"
+DEFAULT_YEARS = "1,5,10,25,50"
+MICRO_REPEATS = 5
+
+
+def _percentile(values: list[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def _latency_summary(values: list[float], elapsed: float) -> dict[str, float]:
+    return {
+        "requests": len(values),
+        "requests_per_second": len(values) / elapsed if elapsed else 0.0,
+        "p50_ms": _percentile(values, 0.50) * 1000,
+        "p99_ms": _percentile(values, 0.99) * 1000,
+        "max_ms": max(values, default=0.0) * 1000,
+        "mean_ms": statistics.fmean(values) * 1000 if values else 0.0,
+    }
+
+
+def _git_commit() -> str | None:
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=SRC_DIR.parent,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return result.stdout.strip() or None
+
+
+def _configure(data_dir: str, password_hash: str) -> None:
+    os.environ.update(
+        {
+            "APP_ENV": "local",
+            "DATA_DIR": data_dir,
+            "HABIT_LOG_DB_PATH": str(Path(data_dir) / "habit-log.db"),
+            "HABIT_LOG_PASSWORD_HASH": password_hash,
+            "HABIT_LOG_SECRET_KEY": "bench",
+        }
+    )
+    for name in ("HABIT_LOG_MULTI_USER", "HABIT_LOG_STARTUP_DIAGNOSTICS"):
+        os.environ.pop(name, None)
+    if str(SRC_DIR) not in sys.path:
+        sys.path.insert(0, str(SRC_DIR))
+
+    from habit_log.config import reload_settings
+    from habit_log.db import close_pool
+
+    close_pool()
+    reload_settings()
+
+
+def generate_history(
+    years: int, end: dt.date, rng: random.Random
+) -> tuple[list[dict[str, object]], list[dict[str, object]]]:
+    from habit_log.rules import OrangeQuotaTracker, compute_day_status
+
+    start = end - dt.timedelta(days=round(years * 365.25) - 1)
+    tracker = OrangeQuotaTracker()
+    days = []
+    day = start
+    while day <= end:
+        row = {
+            "date": day.isoformat(),
+            "walked": int(rng.random() < 0.7),
+            "no_alcohol_after_21": int(rng.random() < 0.85),
+            "food_respected": int(rng.random() < 0.75),
+            "special_occasion": int(rng.random() < 0.15),
+            "note": "Synthetic note" if rng.random() < 0.1 else None,
+        }
+        status = compute_day_status(
+            walked=bool(row["walked"]),
+            food_respected=bool(row["food_respected"]),
+            no_alcohol_after_21=bool(row["no_alcohol_after_21"]),
+            special_occasion=bool(row["special_occasion"]),
+        )
+        if status == "orange" and tracker.add(day) is not None:
+            row["special_occasion"] = 0
+        days.append(row)
+        day += dt.timedelta(days=1)
+
+    weights = []
+    weight = rng.uniform(70, 95)
+    week_day = start
+    while week_day <= end:
+        year, week, _ = week_day.isocalendar()
+        weight = min(150.0, max(45.0, weight + rng.uniform(-0.8, 0.8)))
+        weights.append({"year": year, "week": week, "weight_kg": round(weight, 1)})
+        week_day += dt.timedelta(days=7)
+    return days, weights
+
+
+def _load_history(years: int, seed: int) -> dict[str, object]:
+    from habit_log.db import (
+        init_db,
+        transaction,
+        upsert_daily_logs,
+        upsert_weekly_weights,
+    )
+
+    started = time.perf_counter()
+    days, weights = generate_history(years, dt.date.today(), random.Random(seed))
+    init_db()
+    with transaction():
+        upsert_daily_logs(days)
+        upsert_weekly_weights(weights)
+    return {
+        "years": years,
+        "daily_log_rows": len(days),
+        "weekly_weight_rows": len(weights),
+        "load_seconds": time.perf_counter() - started,
+    }
+
+
+def _measure(
+    request: Callable[[], object],
+    count: int,
+    warmup: int,
+    outcome: Callable[[object], str] | None = None,
+) -> dict:
+    probe = request()
+    if probe.status_code >= 500:
+        return {"error": f"HTTP {probe.status_code}"}
+    for _ in range(warmup):
+        request()
+
+    statuses: Counter = Counter()
+    outcomes: Counter = Counter()
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(count):
+        request_started = time.perf_counter()
+        response = request()
+        latencies.append(time.perf_counter() - request_started)
+        statuses[response.status_code] += 1
+        if outcome is not None:
+            outcomes[outcome(response)] += 1
+    elapsed = time.perf_counter() - started
+    summary = _latency_summary(latencies, elapsed)
+    summary["statuses"] = {
+        str(status): total for status, total in sorted(statuses.items())
+    }
+    if outcome is not None:
+        summary["outcomes"] = dict(sorted(outcomes.items()))
+    return summary
+
+
+def _quota_outcome(response) -> str:
+    if "special_occasion_error" in response.headers.get("Location", ""):
+        return "quota_rejected"
+    return "saved"
+
+
+def _orange_posts(client, today: dt.date) -> Callable[[], object]:
+    dates = [(today - dt.timedelta(days=offset)).isoformat() for offset in range(60)]
+    position = 0
+
+    def post():
+        nonlocal position
+        date_value = dates[position % len(dates)]
+        position += 1
+        return client.post(
+            "/",
+            data={
+                "date": date_value,
+                "walked": "on",
+                "special_occasion": "on",
+                "note": "Benchmark",
+            },
+        )
+
+    return post
+
+
+def bench_endpoints(app, count: int, warmup: int) -> dict[str, dict]:
+    client = app.test_client()
+    client.post("/login", data={"password": PASSWORD, "next": "/"})
+    today = dt.date.today()
+    # Reads run before writes so GET / sees the caches of an unchanged history.
+    return {
+        "GET /": _measure(lambda: client.get("/"), count, warmup),
+        "GET /health": _measure(lambda: client.get("/health"), count, warmup),
+        "GET /weight": _measure(lambda: client.get("/weight"), count, warmup),
+        "POST / (orange quota)": _measure(
+            _orange_posts(client, today), count, warmup, _quota_outcome
+        ),
+    }
+
+
+def _time_call(call: Callable[[], object], number: int) -> dict[str, float]:
+    runs = []
+    for _ in range(MICRO_REPEATS):
+        started = time.perf_counter()
+        for _ in range(number):
+            call()
+        runs.append((time.perf_counter() - started) / number)
+    best = min(runs)
+    return {
+        "calls": number * MICRO_REPEATS,
+        "median_us": statistics.median(runs) * 1_000_000,
+        "best_us": best * 1_000_000,
+        "calls_per_second": 1 / best if best else 0.0,
+    }
+
+
+def bench_micro(number: int) -> dict[str, dict]:
+    from habit_log.app import _format_weight, _parse_weight
+    from habit_log.db import count_orange_days
+    from habit_log.locales import resolve_locale
+    from habit_log.rules import get_iso_week_bounds, get_orange_window_start
+
+    today = dt.date.today()
+    week_start, week_end = get_iso_week_bounds(today)
+    window_start = get_orange_window_start(today)
+    history_start = today - dt.timedelta(days=366)
+    locale = resolve_locale("fr-FR")
+    return {
+        "count_orange_days (week)": _time_call(
+            lambda: count_orange_days(
+                start_date=week_start.isoformat(), end_date=week_end.isoformat()
+            ),
+            number,
+        ),
+        "count_orange_days (30 days)": _time_call(
+            lambda: count_orange_days(
+                start_date=window_start.isoformat(),
+                end_date=today.isoformat(),
+                exclude_date=today.isoformat(),
+            ),
+            number,
+        ),
+        "count_orange_days (1 year)": _time_call(
+            lambda: count_orange_days(
+                start_date=history_start.isoformat(), end_date=today.isoformat()
+            ),
+            number,
+        ),
+        "_parse_weight": _time_call(lambda: _parse_weight("82,4", ","), number * 10),
+        "_format_weight": _time_call(
+            lambda: _format_weight(82.4, locale, ","), number * 10
+        ),
+    }
+
+
+def run_dataset(years: int, args: argparse.Namespace, password_hash: str) -> dict:
+    with tempfile.TemporaryDirectory() as data_dir:
+        _configure(data_dir, password_hash)
+        from habit_log.app import create_app
+        from habit_log.db import close_pool
+
+        result = _load_history(years, args.seed + years)
+        try:
+            app = create_app()
+            result["endpoints"] = bench_endpoints(app, args.requests, args.warmup)
+            result["micro"] = bench_micro(args.micro_calls)
+        finally:
+            close_pool()
+    return result
+
+
+def find_regressions(
+    report: dict, baseline: dict, tolerance: float
+) -> list[dict[str, object]]:
+    previous = {entry["years"]: entry for entry in baseline.get("datasets", [])}
+    regressions = []
+    for entry in report["datasets"]:
+        before = previous.get(entry["years"])
+        if before is None:
+            continue
+        pairs = [
+            (f"{name} p50_ms", result.get("p50_ms"), before["endpoints"].get(name))
+            for name, result in entry["endpoints"].items()
+        ] + [
+            (f"{name} median_us", result["median_us"], before["micro"].get(name))
+            for name, result in entry["micro"].items()
+        ]
+        for label, current, old in pairs:
+            if current is None or not old:
+                continue
+            key = label.rsplit(" ", 1)[1]
+            if key not in old or not old[key]:
+                continue
+            ratio = current / old[key]
+            if ratio > 1 + tolerance:
+                regressions.append(
+                    {
+                        "years": entry["years"],
+                        "metric": label,
+                        "baseline": old[key],
+                        "current": current,
+                        "ratio": round(ratio, 3),
+                    }
+                )
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Measure request latency and hot helpers on synthetic history."
+    )
+    parser.add_argument(
+        "--years",
+        default=DEFAULT_YEARS,
+        help=f"Comma-separated history lengths in years (default: {DEFAULT_YEARS}).",
+    )
+    parser.add_argument("--requests", type=int, default=200, help="Per endpoint.")
+    parser.add_argument("--warmup", type=int, default=10, help="Per endpoint.")
+    parser.add_argument(
+        "--micro-calls",
+        type=int,
+        default=500,
+        help="Calls per repeat for the database micro-benchmarks.",
+    )
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", type=Path, default=None)
+    parser.add_argument(
+        "--baseline",
+        type=Path,
+        default=None,
+        help="Earlier JSON report to compare against.",
+    )
+    parser.add_argument(
+        "--max-regression",
+        type=float,
+        default=0.25,
+        help="Allowed slowdown against --baseline before failing (default: 0.25).",
+    )
+    args = parser.parse_args()
+    years = [int(value) for value in args.years.split(",") if value.strip()]
+    if not years or any(value < 1 or value > 50 for value in years):
+        parser.error("--years must list values between 1 and 50.")
+
+    from werkzeug.security import generate_password_hash
+
+    password_hash = generate_password_hash(PASSWORD, method="pbkdf2:sha256:1")
+    report: dict[str, object] = {
+        "benchmark": "requests",
+        "python": sys.version.split()[0],
+        "git_commit": _git_commit(),
+        "seed": args.seed,
+        "requests_per_endpoint": args.requests,
+        "datasets": [run_dataset(value, args, password_hash) for value in years],
+    }
+
+    regressions = []
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+        regressions = find_regressions(report, baseline, args.max_regression)
+        report["baseline_commit"] = baseline.get("git_commit")
+        report["regressions"] = regressions
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(output + "\n", encoding="utf-8")
+    print(output)
+    if regressions:
+        print(
+            f"{len(regressions)} metrics regressed by more than "
+            f"{args.max_regression:.0%}.",
+            file=sys.stderr,
+        )
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
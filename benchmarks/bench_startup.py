@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+SRC_DIR = Path(__file__).resolve().parent.parent / "src"
+
+CHILD_SCRIPT = """
+import json
+import time
+
+started = time.perf_counter()
+from habit_log import create_app
+imported = time.perf_counter()
+create_app()
+created = time.perf_counter()
+print(json.dumps({
+    "import_ms": (imported - started) * 1000,
+    "create_app_ms": (created - imported) * 1000,
+}))
+"""
+
+
+def _child_env(data_dir: str) -> dict[str, str]:
+    env = dict(os.environ)
+    env.update(
+        {
+            "APP_ENV": "local",
+            "DATA_DIR": data_dir,
+            "HABIT_LOG_DB_PATH": str(Path(data_dir) / "habit-log.db"),
+            "HABIT_LOG_PASSWORD_HASH": "pbkdf2:sha256:1$bench$0",
+            "HABIT_LOG_SECRET_KEY": "bench",
+            "PYTHONPATH": str(SRC_DIR),
+        }
+    )
+    env.pop("HABIT_LOG_STARTUP_DIAGNOSTICS", None)
+    return env
+
+
+def _run_once(data_dir: str) -> dict[str, float]:
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-c", CHILD_SCRIPT],
+        env=_child_env(data_dir),
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    timings["process_ms"] = (time.perf_counter() - started) * 1000
+    return timings
+
+
+def _summarize(samples: list[dict[str, float]]) -> dict[str, dict[str, float]]:
+    summary = {}
+    for key in samples[0]:
+        values = [sample[key] for sample in samples]
+        summary[key] = {
+            "median": statistics.median(values),
+            "min": min(values),
+            "max": max(values),
+        }
+    return summary
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Measure Habit Log cold start.")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument(
+        "--max-ms",
+        type=float,
+        default=None,
+        help="Fail when the median cold process time exceeds this budget.",
+    )
+    parser.add_argument("--output", type=Path, default=None)
+    args = parser.parse_args()
+
+    cold = []
+    warm = []
+    for _ in range(args.runs):
+        with tempfile.TemporaryDirectory() as data_dir:
+            cold.append(_run_once(data_dir))
+            warm.append(_run_once(data_dir))
+
+    report = {
+        "benchmark": "startup",
+        "python": sys.version.split()[0],
+        "runs": args.runs,
+        "cold": _summarize(cold),
+        "warm": _summarize(warm),
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(output + "\n", encoding="utf-8")
+    print(output)
+
+    if args.max_ms is not None and report["cold"]["process_ms"]["median"] > args.max_ms:
+        print(
+            f"Cold start median exceeds budget of {args.max_ms:.0f} ms.",
+            file=sys.stderr,
+        )
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
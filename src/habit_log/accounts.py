@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+import datetime as dt
+import re
+import sqlite3
+from pathlib import Path
+
+from .config import get_accounts_db_path
+from .db import ConnectionPool, close_named_pool, get_named_pool
+
+ACCOUNTS_POOL = "accounts"
+USERNAME_PATTERN = re.compile(r"^[A-Za-z0-9_.-]{1,64}$")
+ACCOUNTS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id                  INTEGER     PRIMARY KEY,
+    username            TEXT        NOT NULL UNIQUE COLLATE NOCASE,
+    password_hash       TEXT        NOT NULL,
+    created_at          TEXT        NOT NULL
+);
+"""
+
+
+class AccountError(ValueError):
+    pass
+
+
+def _get_pool() -> ConnectionPool:
+    return get_named_pool(ACCOUNTS_POOL, get_accounts_db_path())
+
+
+def close_accounts() -> None:
+    close_named_pool(ACCOUNTS_POOL)
+
+
+def init_accounts() -> None:
+    Path(get_accounts_db_path()).parent.mkdir(parents=True, exist_ok=True)
+    with _get_pool().writer() as conn:
+        conn.executescript(ACCOUNTS_SCHEMA)
+
+
+def check_accounts_health() -> None:
+    _get_pool().acquire().execute("SELECT 1").fetchone()
+
+
+def shard_name(user_id: int) -> str:
+    return f"user-{user_id}"
+
+
+def _row_to_user(row: sqlite3.Row) -> dict[str, object]:
+    return {
+        "id": row["id"],
+        "username": row["username"],
+        "password_hash": row["password_hash"],
+        "created_at": row["created_at"],
+    }
+
+
+def get_user(user_id: int) -> dict[str, object] | None:
+    row = (
+        _get_pool()
+        .acquire()
+        .execute(
+            "SELECT id, username, password_hash, created_at FROM users WHERE id = ?",
+            (user_id,),
+        )
+        .fetchone()
+    )
+    return _row_to_user(row) if row else None
+
+
+def get_user_by_username(username: str) -> dict[str, object] | None:
+    row = (
+        _get_pool()
+        .acquire()
+        .execute(
+            """
+            SELECT id, username, password_hash, created_at
+            FROM users
+            WHERE username = ?
+            """,
+            (username.strip(),),
+        )
+        .fetchone()
+    )
+    return _row_to_user(row) if row else None
+
+
+def list_users() -> list[dict[str, object]]:
+    rows = (
+        _get_pool()
+        .acquire()
+        .execute("SELECT id, username, created_at FROM users ORDER BY id")
+        .fetchall()
+    )
+    return [dict(row) for row in rows]
+
+
+def create_user(username: str, password_hash: str) -> int:
+    username = username.strip()
+    if not USERNAME_PATTERN.match(username):
+        raise AccountError(
+            "Usernames are 1-64 letters, digits, '.', '_' or '-' characters."
+        )
+    now = dt.datetime.utcnow().replace(microsecond=0).isoformat()
+    with _get_pool().writer() as conn:
+        try:
+            cursor = conn.execute(
+                """
+                INSERT INTO users (username, password_hash, created_at)
+                VALUES (?, ?, ?)
+                """,
+                (username, password_hash, now),
+            )
+        except sqlite3.IntegrityError as exc:
+            raise AccountError(f"User {username!r} already exists.") from exc
+    return int(cursor.lastrowid)
+
+
+def set_password_hash(user_id: int, password_hash: str) -> None:
+    with _get_pool().writer() as conn:
+        cursor = conn.execute(
+            "UPDATE users SET password_hash = ? WHERE id = ?",
+            (password_hash, user_id),
+        )
+    if not cursor.rowcount:
+        raise AccountError(f"Unknown user id {user_id}.")
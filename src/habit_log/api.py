@@ -0,0 +1,271 @@
+from __future__ import annotations
+
+import datetime as dt
+import gzip
+import json
+import re
+from typing import Callable, Hashable
+
+from flask import Blueprint, Flask, Response, request
+
+from .db import (
+    get_daily_logs_range,
+    get_weekly_weights_range,
+    transaction,
+    upsert_daily_logs,
+    upsert_weekly_weights,
+)
+from .importer import (
+    RowError,
+    check_orange_quotas,
+    parse_daily_log_record,
+    parse_weekly_weight_record,
+)
+from .rules import compute_day_status
+from .sync import SyncError, parse_cursor, parse_limit, pull_changes
+
+API_PREFIX = "/api/v1"
+DEFAULT_DAYS_RANGE = 30
+DEFAULT_WEEKS_RANGE = 52
+MAX_DAYS_RANGE = 366
+MAX_BATCH_SIZE = 366
+MAX_SYNC_PUSH_SIZE = 5000
+GZIP_MIN_BYTES = 512
+ISO_WEEK_PATTERN = re.compile(r"^(?P<year>\d{4})-?W(?P<week>\d{2})$")
+
+
+class ApiError(ValueError):
+    def __init__(
+        self,
+        message: str,
+        status: int = 400,
+        errors: list[dict[str, object]] | None = None,
+    ) -> None:
+        super().__init__(message)
+        self.status = status
+        self.errors = errors
+
+
+def _parse_day_arg(name: str, default: dt.date) -> dt.date:
+    value = request.args.get(name)
+    if not value:
+        return default
+    try:
+        return dt.date.fromisoformat(value)
+    except ValueError as exc:
+        raise ApiError(f"{name} must be an ISO date (YYYY-MM-DD).") from exc
+
+
+def _parse_week_arg(name: str, default: tuple[int, int]) -> tuple[int, int]:
+    value = request.args.get(name)
+    if not value:
+        return default
+    match = ISO_WEEK_PATTERN.match(value)
+    try:
+        if match is None:
+            raise ValueError(value)
+        year, week = int(match["year"]), int(match["week"])
+        dt.date.fromisocalendar(year, week, 1)
+    except ValueError as exc:
+        raise ApiError(f"{name} must be an ISO week (YYYY-Www).") from exc
+    return year, week
+
+
+def _get_batch(key: str) -> list[object]:
+    payload = request.get_json(silent=True)
+    if isinstance(payload, dict):
+        payload = payload.get(key)
+    if not isinstance(payload, list):
+        raise ApiError(f"Body must be a JSON list or an object with a {key!r} list.")
+    if not payload:
+        raise ApiError("Batch is empty.")
+    if len(payload) > MAX_BATCH_SIZE:
+        raise ApiError(f"Batches are limited to {MAX_BATCH_SIZE} items.")
+    return payload
+
+
+def _get_sync_push() -> tuple[list[object], list[object]]:
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        raise ApiError("Body must be a JSON object with 'days' and/or 'weights'.")
+    days = payload.get("days") or []
+    weights = payload.get("weights") or []
+    if not isinstance(days, list) or not isinstance(weights, list):
+        raise ApiError("'days' and 'weights' must be JSON lists.")
+    if len(days) + len(weights) > MAX_SYNC_PUSH_SIZE:
+        raise ApiError(f"Pushes are limited to {MAX_SYNC_PUSH_SIZE} items.")
+    return days, weights
+
+
+def _json_response(payload: dict[str, object]) -> Response:
+    body = json.dumps(payload, separators=(",", ":")).encode()
+    response = Response(body, mimetype="application/json")
+    response.vary.add("Accept-Encoding")
+    if len(body) >= GZIP_MIN_BYTES and "gzip" in request.accept_encodings:
+        response.set_data(gzip.compress(body, compresslevel=6))
+        response.headers["Content-Encoding"] = "gzip"
+    return response
+
+
+def _day_to_json(row: dict[str, object]) -> dict[str, object]:
+    return {
+        **row,
+        "status": compute_day_status(
+            walked=bool(row["walked"]),
+            food_respected=bool(row["food_respected"]),
+            no_alcohol_after_21=bool(row["no_alcohol_after_21"]),
+            special_occasion=bool(row["special_occasion"]),
+        ),
+    }
+
+
+def _read_days(start: dt.date, end: dt.date) -> list[dict[str, object]]:
+    if end < start:
+        raise ApiError("end must not be before start.")
+    if (end - start).days + 1 > MAX_DAYS_RANGE:
+        raise ApiError(f"Ranges are limited to {MAX_DAYS_RANGE} days.")
+    logs = get_daily_logs_range(start.isoformat(), end.isoformat())
+    return [_day_to_json(row) for row in logs.values() if row is not None]
+
+
+def _parse_batch(
+    items: list[object],
+    parse: Callable[[dict[str, object]], dict[str, object]],
+    key: Callable[[dict[str, object]], Hashable],
+) -> dict[Hashable, dict[str, object]]:
+    rows: dict[Hashable, dict[str, object]] = {}
+    errors = []
+    for index, item in enumerate(items):
+        try:
+            if not isinstance(item, dict):
+                raise RowError("Item must be a JSON object.")
+            row = parse(item)
+            if key(row) in rows:
+                raise RowError("Duplicate item in batch.")
+        except RowError as exc:
+            errors.append({"index": index, "error": str(exc)})
+            continue
+        rows[key(row)] = row
+    if errors:
+        raise ApiError("Batch contains invalid items.", 422, errors)
+    return rows
+
+
+def _check_orange_quotas(days: dict[Hashable, dict[str, object]]) -> None:
+    violations = check_orange_quotas(days)
+    if violations:
+        raise ApiError(
+            "Batch breaks the orange-day limits.",
+            422,
+            [
+                {"date": date_value, "error": error}
+                for date_value, error in sorted(violations.items())
+            ],
+        )
+
+
+def register_api(app: Flask) -> None:
+    api = Blueprint("api", __name__, url_prefix=API_PREFIX)
+
+    @api.errorhandler(ApiError)
+    def _api_error(exc: ApiError):
+        body: dict[str, object] = {"error": str(exc)}
+        if exc.errors is not None:
+            body["errors"] = exc.errors
+        return body, exc.status
+
+    @api.get("/days")
+    def list_days():
+        end = _parse_day_arg("end", dt.date.today())
+        start = _parse_day_arg(
+            "start", end - dt.timedelta(days=DEFAULT_DAYS_RANGE - 1)
+        )
+        return {
+            "start": start.isoformat(),
+            "end": end.isoformat(),
+            "days": _read_days(start, end),
+        }
+
+    @api.put("/days")
+    def put_days():
+        days = _parse_batch(
+            _get_batch("days"), parse_daily_log_record, lambda row: row["date"]
+        )
+        with transaction():
+            _check_orange_quotas(days)
+            upsert_daily_logs(days[date_value] for date_value in sorted(days))
+            start = dt.date.fromisoformat(min(days))
+            end = dt.date.fromisoformat(max(days))
+            logs = get_daily_logs_range(start.isoformat(), end.isoformat())
+        return {
+            "updated": len(days),
+            "days": [_day_to_json(logs[date_value]) for date_value in sorted(days)],
+        }
+
+    @api.get("/weights")
+    def list_weights():
+        current = dt.date.today().isocalendar()
+        end = _parse_week_arg("end", (current.year, current.week))
+        default_start = dt.date.fromisocalendar(*end, 1) - dt.timedelta(
+            weeks=DEFAULT_WEEKS_RANGE - 1
+        )
+        start = _parse_week_arg("start", default_start.isocalendar()[:2])
+        if end < start:
+            raise ApiError("end must not be before start.")
+        return {
+            "start": f"{start[0]}-W{start[1]:02d}",
+            "end": f"{end[0]}-W{end[1]:02d}",
+            "weights": get_weekly_weights_range(start, end),
+        }
+
+    @api.put("/weights")
+    def put_weights():
+        weights = _parse_batch(
+            _get_batch("weights"),
+            parse_weekly_weight_record,
+            lambda row: (row["year"], row["week"]),
+        )
+        keys = sorted(weights)
+        with transaction():
+            upsert_weekly_weights(weights[key] for key in keys)
+            stored = get_weekly_weights_range(keys[0], keys[-1])
+        return {
+            "updated": len(weights),
+            "weights": [
+                row for row in stored if (row["year"], row["week"]) in weights
+            ],
+        }
+
+    @api.get("/sync")
+    def sync_pull():
+        try:
+            cursor = parse_cursor(request.args.get("cursor"), request.args.get("since"))
+            limit = parse_limit(request.args.get("limit"))
+        except SyncError as exc:
+            raise ApiError(str(exc)) from exc
+        return _json_response(pull_changes(cursor, limit))
+
+    @api.post("/sync")
+    def sync_push():
+        day_items, weight_items = _get_sync_push()
+        days = (
+            _parse_batch(day_items, parse_daily_log_record, lambda row: row["date"])
+            if day_items
+            else {}
+        )
+        weights = (
+            _parse_batch(
+                weight_items,
+                parse_weekly_weight_record,
+                lambda row: (row["year"], row["week"]),
+            )
+            if weight_items
+            else {}
+        )
+        with transaction():
+            _check_orange_quotas(days)
+            changed = upsert_daily_logs(days[key] for key in sorted(days))
+            changed += upsert_weekly_weights(weights[key] for key in sorted(weights))
+        return {"days": len(days), "weights": len(weights), "changed": changed}
+
+    app.register_blueprint(api)
@@ -1,54 +1,77 @@
 from __future__ import annotations
 
+import hashlib
+import io
 import re
+import shutil
 import sqlite3
-from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
-from datetime import date as dt_date, timedelta
+import tempfile
+from decimal import Decimal, InvalidOperation
+from datetime import date as dt_date, datetime, timedelta, timezone
 from pathlib import Path
 from urllib.parse import unquote
 
-from babel.core import Locale, UnknownLocaleError
-from babel.numbers import NumberFormatError, format_decimal, get_decimal_symbol
-from flask import Flask, redirect, render_template, request, url_for
+from flask import Flask, Response, redirect, render_template, request, url_for
+from markupsafe import Markup
+from werkzeug.exceptions import RequestEntityTooLarge
 
+from .api import register_api
 from .auth import login_required, register_auth
-from .config import get_bind_host, get_bind_port
+from .config import get_settings
+from .daystatus import get_day_status_bitmap
 from .db import (
-    count_orange_days,
+    check_health,
+    count_orange_days_by_window,
     get_daily_log,
-    get_db_path,
+    get_daily_log_validator_rows,
+    get_daily_logs_range,
+    get_pool_stats,
+    get_revisions,
+    get_shard_key,
+    get_shard_stats,
     get_weekly_weight,
     init_db,
+    iter_in_current_database,
+    transaction,
     upsert_daily_log,
     upsert_weekly_weight,
 )
+from .export import (
+    EXPORT_TABLES,
+    ExportError,
+    iter_export,
+    parse_since,
+    parse_tables,
+)
+from .fragments import get_fragment_cache
+from .importer import ImportFormatError, import_records, infer_format
+from .locales import ResolvedLocale, format_weight, resolve_locale
+from .metrics import register_metrics
+from .profiler import register_profiler
+from .rules import (
+    WEIGHT_RANGE_ERROR,
+    compute_day_status,
+    get_iso_week_bounds,
+    get_orange_window_start,
+    is_weight_in_range,
+    normalize_weight,
+    orange_quota_error,
+)
+from .stats import compute_stats
+from .trends import get_weight_trend
 
 
 def _get_bind() -> tuple[str, int]:
-    return get_bind_host(), get_bind_port()
+    settings = get_settings()
+    return settings.bind_host, settings.bind_port
 
 
-DEFAULT_LOCALE = "en_US"
-WEIGHT_MIN = Decimal("3")
-WEIGHT_MAX = Decimal("500")
-WEIGHT_QUANT = Decimal("0.1")
 WEIGHT_PATTERN = re.compile(r"^\d+(?:[.,]\d+)?$")
+IMPORT_SPOOL_BYTES = 1024 * 1024
 
 
-def _normalize_locale(raw_locale: str | None) -> str:
-    if not raw_locale:
-        return DEFAULT_LOCALE
-    value = raw_locale.replace("-", "_")
-    try:
-        Locale.parse(value)
-    except (ValueError, UnknownLocaleError):
-        base = value.split("_", 1)[0]
-        try:
-            Locale.parse(base)
-        except (ValueError, UnknownLocaleError):
-            return DEFAULT_LOCALE
-        return base
-    return value
+class WeightFormatError(ValueError):
+    pass
 
 
 def _decode_cookie(value: str | None) -> str | None:
@@ -57,16 +80,16 @@ def _decode_cookie(value: str | None) -> str | None:
     return unquote(value)
 
 
-def _get_request_locale() -> str:
+def _get_request_locale() -> ResolvedLocale:
     raw_locale = (
         request.form.get("locale")
         or _decode_cookie(request.cookies.get("habit_log_locale"))
         or request.accept_languages.best
     )
-    return _normalize_locale(raw_locale)
+    return resolve_locale(raw_locale)
 
 
-def _get_request_decimal_symbol(locale: str) -> str:
+def _get_request_decimal_symbol(locale: ResolvedLocale) -> str:
     symbol = (
         request.form.get("decimal_symbol")
         or _decode_cookie(request.cookies.get("habit_log_decimal"))
@@ -74,15 +97,15 @@ def _get_request_decimal_symbol(locale: str) -> str:
     ).strip()
     if symbol in {".", ","}:
         return symbol
-    return get_decimal_symbol(locale)
+    return locale.decimal_symbol
 
 
 def _parse_weight(value: str, decimal_symbol: str) -> Decimal:
     cleaned = value.strip()
     if not cleaned:
-        raise NumberFormatError("Empty weight.")
+        raise WeightFormatError("Empty weight.")
     if not WEIGHT_PATTERN.match(cleaned):
-        raise NumberFormatError("Invalid weight format.")
+        raise WeightFormatError("Invalid weight format.")
 
     separator = None
     if "," in cleaned:
@@ -97,63 +120,165 @@ def _parse_weight(value: str, decimal_symbol: str) -> Decimal:
     try:
         return Decimal(normalized)
     except InvalidOperation as exc:
-        raise NumberFormatError(str(exc)) from exc
-
+        raise WeightFormatError(str(exc)) from exc
 
-def _normalize_weight(value: Decimal) -> Decimal:
-    return value.quantize(WEIGHT_QUANT, rounding=ROUND_HALF_UP)
 
-
-def _format_weight(value: float | None, locale: str, decimal_symbol: str) -> str:
+def _format_weight(
+    value: float | None,
+    locale: ResolvedLocale,
+    decimal_symbol: str,
+) -> str:
     if value is None:
         return ""
     try:
-        formatted = format_decimal(value, format="0.0", locale=locale)
-    except (ValueError, UnknownLocaleError):
+        return format_weight(value, locale, decimal_symbol)
+    except ValueError:
         return str(value)
-    locale_symbol = get_decimal_symbol(locale)
-    if decimal_symbol and decimal_symbol != locale_symbol:
-        return formatted.replace(locale_symbol, decimal_symbol)
-    return formatted
-
-
-def _compute_day_status(
-    *,
-    walked: bool,
-    food_respected: bool,
-    no_alcohol_after_21: bool,
-    special_occasion: bool,
-) -> str:
-    if walked and food_respected and no_alcohol_after_21:
-        return "green"
-    if special_occasion:
-        return "orange"
-    return "red"
 
 
-def _get_iso_week_bounds(day: dt_date) -> tuple[dt_date, dt_date]:
-    week = day.isocalendar()
-    start = dt_date.fromisocalendar(week.year, week.week, 1)
-    end = dt_date.fromisocalendar(week.year, week.week, 7)
-    return start, end
+def _check_orange_quota(selected_day: dt_date, date_value: str) -> str | None:
+    week_start, week_end = get_iso_week_bounds(selected_day)
+    window_start = get_orange_window_start(selected_day)
+    orange_week, orange_window = count_orange_days_by_window(
+        [
+            (week_start.isoformat(), week_end.isoformat()),
+            (window_start.isoformat(), selected_day.isoformat()),
+        ],
+        exclude_date=date_value,
+    )
+    return orange_quota_error(orange_week, orange_window)
+
+
+def _get_template_version(app: Flask, *names: str) -> str:
+    template_dir = Path(app.root_path) / (app.template_folder or "templates")
+    stamps = []
+    for name in names:
+        try:
+            stamps.append(str((template_dir / name).stat().st_mtime_ns))
+        except OSError:
+            stamps.append("")
+    return ":".join(stamps)
+
+
+def _parse_timestamp(value: object) -> datetime | None:
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(str(value))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+def _daily_log_validator(
+    selected_day: dt_date,
+    recent_days_count: int,
+    locale: ResolvedLocale,
+    decimal_symbol: str,
+    template_version: str,
+) -> tuple[str, datetime | None]:
+    current = selected_day.isocalendar()
+    days, weight = get_daily_log_validator_rows(
+        (selected_day - timedelta(days=recent_days_count)).isoformat(),
+        selected_day.isoformat(),
+        current.year,
+        current.week,
+    )
+    timestamps = [
+        stamp
+        for stamp in (
+            *(_parse_timestamp(row[4]) for row in days),
+            _parse_timestamp(weight[1]) if weight else None,
+        )
+        if stamp is not None
+    ]
+    digest = hashlib.sha1(usedforsecurity=False)
+    for part in (
+        get_shard_key(),
+        template_version,
+        dt_date.today().isoformat(),
+        locale.name,
+        decimal_symbol,
+        sorted(request.args.items(multi=True)),
+        days,
+        weight,
+    ):
+        digest.update(repr(part).encode())
+        digest.update(b"\0")
+    return digest.hexdigest(), max(timestamps, default=None)
+
+
+def _is_not_modified(etag: str) -> bool:
+    # The page also depends on today's date, the query, the locale and the
+    # templates, which only the ETag covers; If-Modified-Since alone would
+    # keep serving a stale page after midnight or a deploy.
+    return request.if_none_match.contains(etag)
+
+
+def _set_validators(
+    response: Response, etag: str, last_modified: datetime | None
+) -> Response:
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    response.vary.update(("Cookie", "Accept-Language"))
+    return response
 
 
 def create_app() -> Flask:
-    init_db()
+    multi_user = get_settings().multi_user
+    if multi_user:
+        from .accounts import check_accounts_health, init_accounts
+
+        init_accounts()
+    else:
+        init_db()
 
     app = Flask(__name__)
+    app.config["MAX_CONTENT_LENGTH"] = get_settings().max_upload_bytes
+    trusted_proxies = get_settings().trusted_proxies
+    if trusted_proxies:
+        from werkzeug.middleware.proxy_fix import ProxyFix
+
+        app.wsgi_app = ProxyFix(
+            app.wsgi_app,
+            x_for=trusted_proxies,
+            x_proto=trusted_proxies,
+            x_host=trusted_proxies,
+        )
+    register_metrics(
+        app,
+        gauges=(
+            ("pool", get_pool_stats),
+            ("shards", get_shard_stats),
+            ("fragments", get_fragment_cache().stats),
+            ("login", lambda: app.extensions["habit_log_login"]["verifier"].stats()),
+        ),
+    )
+    register_profiler(app)
     register_auth(app)
-
-    def _check_db_readonly() -> None:
-        db_path = Path(get_db_path())
-        db_uri = f"file:{db_path.as_posix()}?mode=ro"
-        with sqlite3.connect(db_uri, uri=True) as conn:
-            conn.execute("SELECT 1").fetchone()
+    register_api(app)
+    recent_days_count = get_settings().recent_days
+    template_version = _get_template_version(
+        app,
+        "base.html",
+        "daily_log.html",
+        "_recent_days.html",
+        "_weekly_weight.html",
+    )
+    fragments = get_fragment_cache()
 
     @app.get("/health")
     def health() -> tuple[dict[str, str], int]:
         try:
-            _check_db_readonly()
+            if multi_user:
+                check_accounts_health()
+            else:
+                check_health()
         except sqlite3.Error:
             return {"status": "error"}, 500
         return {"status": "ok"}, 200
@@ -196,58 +321,41 @@ def create_app() -> Flask:
             if error is None and weight_value and allow_weight_edit:
                 try:
                     parsed_weight = _parse_weight(weight_value, decimal_symbol)
-                    rounded_weight = _normalize_weight(parsed_weight)
-                    if rounded_weight < WEIGHT_MIN or rounded_weight > WEIGHT_MAX:
+                    rounded_weight = normalize_weight(parsed_weight)
+                    if not is_weight_in_range(rounded_weight):
                         raise ValueError("Weight out of range.")
                     weight_kg = float(rounded_weight)
-                except (NumberFormatError, ValueError):
-                    error = "Weight must be a number between 3.0 and 500.0 kg."
+                except (WeightFormatError, ValueError):
+                    error = WEIGHT_RANGE_ERROR
 
             if error is None:
-                day_status = _compute_day_status(
+                day_status = compute_day_status(
                     walked=walked,
                     food_respected=food_respected,
                     no_alcohol_after_21=no_alcohol_after_21,
                     special_occasion=special_occasion,
                 )
-                if day_status == "orange":
-                    week_start, week_end = _get_iso_week_bounds(selected_day)
-                    orange_week = count_orange_days(
-                        start_date=week_start.isoformat(),
-                        end_date=week_end.isoformat(),
-                        exclude_date=date_value,
-                    )
-                    window_start = selected_day - timedelta(days=29)
-                    orange_window = count_orange_days(
-                        start_date=window_start.isoformat(),
-                        end_date=selected_day.isoformat(),
-                        exclude_date=date_value,
-                    )
-                    if orange_week + 1 > 2:
-                        special_occasion_error = (
-                            "Only 2 orange days are allowed per ISO week."
+                with transaction():
+                    if day_status == "orange":
+                        special_occasion_error = _check_orange_quota(
+                            selected_day, date_value
                         )
-                    elif orange_window + 1 > 5:
-                        special_occasion_error = (
-                            "Only 5 orange days are allowed in any 30-day window."
+                    if special_occasion_error is None:
+                        if weight_kg is not None and allow_weight_edit:
+                            upsert_weekly_weight(
+                                year=week_year,
+                                week=week_number,
+                                weight_kg=weight_kg,
+                            )
+                        upsert_daily_log(
+                            date_value=date_value,
+                            walked=walked,
+                            no_alcohol_after_21=no_alcohol_after_21,
+                            food_respected=food_respected,
+                            note=note,
+                            special_occasion=special_occasion,
                         )
 
-            if error is None and special_occasion_error is None:
-                if weight_kg is not None and allow_weight_edit:
-                    upsert_weekly_weight(
-                        year=week_year,
-                        week=week_number,
-                        weight_kg=weight_kg,
-                    )
-                upsert_daily_log(
-                    date_value=date_value,
-                    walked=walked,
-                    no_alcohol_after_21=no_alcohol_after_21,
-                    food_respected=food_respected,
-                    note=note,
-                    special_occasion=special_occasion,
-                )
-
             params: dict[str, str] = {"date": date_value}
             if edit_weight:
                 params["edit_weight"] = "1"
@@ -273,17 +381,65 @@ def create_app() -> Flask:
             error = "Invalid date."
             date_value = today_value
             selected_day = dt_date.fromisoformat(date_value)
+        date_value = selected_day.isoformat()
+
+        etag, last_modified = _daily_log_validator(
+            selected_day,
+            recent_days_count,
+            locale,
+            decimal_symbol,
+            template_version,
+        )
+        if _is_not_modified(etag):
+            return _set_validators(Response(status=304), etag, last_modified)
 
         current = selected_day.isocalendar()
         week_year = current.year
         week_number = current.week
-        weekly_entry = get_weekly_weight(week_year, week_number)
         entry = get_daily_log(date_value)
-        weekly_weight_display = _format_weight(
-            weekly_entry["weight_kg"] if weekly_entry else None,
-            locale,
-            decimal_symbol,
-        )
+        revisions = get_revisions()
+        edit_weight = request.args.get("edit_weight") == "1"
+
+        def render_weekly_weight() -> str:
+            weekly_entry = get_weekly_weight(week_year, week_number)
+            return render_template(
+                "_weekly_weight.html",
+                date_value=date_value,
+                weekly_entry=weekly_entry,
+                weekly_editable=weekly_entry is None or edit_weight,
+                weekly_weight_display=_format_weight(
+                    weekly_entry["weight_kg"] if weekly_entry else None,
+                    locale,
+                    decimal_symbol,
+                ),
+                weekly_label=f"{week_year}-W{week_number:02d}",
+            )
+
+        def render_recent_days() -> str:
+            # A bounded range query keeps the strip's cost independent of how
+            # much history exists; the status bitmap is rebuilt on every write.
+            logs = get_daily_logs_range(
+                (selected_day - timedelta(days=recent_days_count)).isoformat(),
+                (selected_day - timedelta(days=1)).isoformat(),
+            )
+            recent_days = []
+            for offset in range(1, recent_days_count + 1):
+                day_value = (selected_day - timedelta(days=offset)).isoformat()
+                day_entry = logs[day_value]
+                recent_days.append(
+                    {
+                        "date": day_value,
+                        "status": compute_day_status(
+                            walked=day_entry["walked"],
+                            food_respected=day_entry["food_respected"],
+                            no_alcohol_after_21=day_entry["no_alcohol_after_21"],
+                            special_occasion=day_entry["special_occasion"],
+                        )
+                        if day_entry is not None
+                        else "red",
+                    }
+                )
+            return render_template("_recent_days.html", recent_days=recent_days)
 
         use_draft = request.args.get("draft") == "1"
         if use_draft:
@@ -305,44 +461,35 @@ def create_app() -> Flask:
             special_occasion = entry["special_occasion"]
             note = entry["note"] or ""
 
-        day_status = _compute_day_status(
+        day_status = compute_day_status(
             walked=walked,
             food_respected=food_respected,
             no_alcohol_after_21=no_alcohol_after_21,
             special_occasion=special_occasion,
         )
 
-        recent_days = []
-        for offset in range(1, 8):
-            day = selected_day - timedelta(days=offset)
-            day_value = day.isoformat()
-            day_entry = get_daily_log(day_value)
-            if day_entry is None:
-                day_walked = False
-                day_no_alcohol_after_21 = False
-                day_food_respected = False
-                day_special_occasion = False
-            else:
-                day_walked = day_entry["walked"]
-                day_no_alcohol_after_21 = day_entry["no_alcohol_after_21"]
-                day_food_respected = day_entry["food_respected"]
-                day_special_occasion = day_entry["special_occasion"]
-            recent_days.append(
-                {
-                    "date": day_value,
-                    "status": _compute_day_status(
-                        walked=day_walked,
-                        food_respected=day_food_respected,
-                        no_alcohol_after_21=day_no_alcohol_after_21,
-                        special_occasion=day_special_occasion,
-                    ),
-                }
-            )
-
-        edit_weight = request.args.get("edit_weight") == "1"
-        weekly_editable = weekly_entry is None or edit_weight
+        weekly_weight_html = fragments.get_or_render(
+            "weekly_weight",
+            (
+                "weekly_weight",
+                week_year,
+                week_number,
+                date_value,
+                locale.name,
+                decimal_symbol,
+                edit_weight,
+            ),
+            revisions["weekly_weight"],
+            render_weekly_weight,
+        )
+        recent_days_html = fragments.get_or_render(
+            "daily_log",
+            ("recent_days", date_value, recent_days_count),
+            revisions["daily_log"],
+            render_recent_days,
+        )
 
-        return render_template(
+        page = render_template(
             "daily_log.html",
             date_value=date_value,
             entry=entry,
@@ -353,13 +500,91 @@ def create_app() -> Flask:
             special_occasion=special_occasion,
             note=note,
             day_status=day_status,
-            recent_days=recent_days,
             special_occasion_error=special_occasion_error,
-            weekly_entry=weekly_entry,
-            weekly_editable=weekly_editable,
-            weekly_weight_display=weekly_weight_display,
-            weekly_label=f"{week_year}-W{week_number:02d}",
+            weekly_weight_html=Markup(weekly_weight_html),
+            recent_days_html=Markup(recent_days_html),
+        )
+        return _set_validators(Response(page), etag, last_modified)
+
+    @app.get("/stats")
+    @login_required
+    def stats():
+        return render_template(
+            "stats.html",
+            stats=compute_stats(get_day_status_bitmap(), dt_date.today()),
+        )
+
+    @app.get("/stats.json")
+    @login_required
+    def stats_json() -> dict[str, object]:
+        return compute_stats(
+            get_day_status_bitmap(),
+            dt_date.today(),
+            include_series=request.args.get("series") == "1",
+        )
+
+    @app.get("/weight/trend")
+    @login_required
+    def weight_trend() -> dict[str, object]:
+        return get_weight_trend()
+
+    def _export_response(export_format: str, default_tables: tuple[str, ...]):
+        try:
+            tables = parse_tables(request.args.get("table"), default=default_tables)
+            since = parse_since(request.args.get("since"))
+            chunks = iter_export(export_format, tables, since)
+        except ExportError as exc:
+            return {"error": str(exc)}, 400
+
+        mimetype = "text/csv" if export_format == "csv" else "application/x-ndjson"
+        filename = f"habit-log-{'-'.join(tables)}.{export_format}"
+        return Response(
+            iter_in_current_database(chunks),
+            mimetype=mimetype,
+            headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+        )
+
+    @app.get("/export.csv")
+    @login_required
+    def export_csv():
+        return _export_response("csv", ("daily_log",))
+
+    @app.get("/export.ndjson")
+    @login_required
+    def export_ndjson():
+        return _export_response("ndjson", EXPORT_TABLES)
+
+    @app.errorhandler(RequestEntityTooLarge)
+    def _upload_too_large(exc: RequestEntityTooLarge):
+        limit = app.config["MAX_CONTENT_LENGTH"]
+        message = f"Request body is larger than {limit} bytes."
+        if request.endpoint == "bulk_import":
+            return {"error": message}, 413
+        return message, 413
+
+    @app.post("/import")
+    @login_required
+    def bulk_import():
+        upload = request.files.get("file")
+        filename = upload.filename if upload else None
+        import_format = request.values.get("format") or infer_format(
+            filename, default="csv" if request.mimetype == "text/csv" else "ndjson"
         )
+        table = request.values.get("table") or "daily_log"
+        if upload:
+            source = upload.stream
+        else:
+            # Spool the raw body first so a slow client never holds the
+            # database write lock while the import reads from the socket.
+            source = tempfile.SpooledTemporaryFile(max_size=IMPORT_SPOOL_BYTES)
+            shutil.copyfileobj(request.stream, source)
+            source.seek(0)
+        text = io.TextIOWrapper(source, encoding="utf-8-sig", newline="")
+        try:
+            report = import_records(text, import_format, table=table)
+        except ImportFormatError as exc:
+            return {"error": str(exc)}, 400
+        return report, 200
 
 # Legacy / fallback route.
 # Primary UX for weekly weight is integrated into the daily log ("/").
@@ -381,12 +606,12 @@ def create_app() -> Flask:
             else:
                 try:
                     parsed_weight = _parse_weight(weight_value, decimal_symbol)
-                    rounded_weight = _normalize_weight(parsed_weight)
-                    if rounded_weight < WEIGHT_MIN or rounded_weight > WEIGHT_MAX:
+                    rounded_weight = normalize_weight(parsed_weight)
+                    if not is_weight_in_range(rounded_weight):
                         raise ValueError("Weight out of range.")
                     weight_kg = float(rounded_weight)
-                except (NumberFormatError, ValueError):
-                    error = "Weight must be a number between 3.0 and 500.0 kg."
+                except (WeightFormatError, ValueError):
+                    error = WEIGHT_RANGE_ERROR
                 else:
                     upsert_weekly_weight(
                         year=current_year,
@@ -417,4 +642,9 @@ def create_app() -> Flask:
 def run() -> None:
     host, port = _get_bind()
     app = create_app()
-    app.run(host=host, port=port)
+    if get_settings().server_mode == "production":
+        from .server import serve
+
+        serve(app, host=host, port=port)
+        return
+    app.run(host=host, port=port, threaded=True)
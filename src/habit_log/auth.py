@@ -1,21 +1,32 @@
 from __future__ import annotations
 
+import secrets
+from contextlib import ExitStack
 from datetime import timedelta
 from functools import wraps
 from typing import Callable, TypeVar
 
-from flask import Flask, redirect, render_template, request, session, url_for
-from werkzeug.security import check_password_hash
+from flask import Flask, g, redirect, render_template, request, session, url_for
+from werkzeug.security import check_password_hash, generate_password_hash
 
-from .config import (
-    get_password_hash,
-    get_secret_key,
-    get_session_cookie_secure,
-    get_session_days,
+from .config import get_password_hash, get_secret_key, get_settings
+from .login_guard import (
+    FailedLoginThrottle,
+    LoginBusyError,
+    LoginThrottledError,
+    PasswordVerifier,
 )
+
 T = TypeVar("T")
 
 SESSION_KEY = "authenticated"
+SESSION_USER_KEY = "user_id"
+API_PATH_PREFIX = "/api/"
+METRICS_ENDPOINT = "metrics"
+LOGIN_ERROR = "Invalid password."
+MULTI_USER_LOGIN_ERROR = "Invalid username or password."
+LOGIN_BUSY_ERROR = "The server is busy. Try again in a moment."
+LOGIN_BUSY_RETRY_SECONDS = 1
 
 
 def _get_password_hash() -> str:
@@ -27,7 +38,21 @@ def _get_secret_key() -> str:
 
 
 def _is_authenticated() -> bool:
-    return bool(session.get(SESSION_KEY))
+    if not session.get(SESSION_KEY):
+        return False
+    if get_settings().multi_user:
+        return isinstance(session.get(SESSION_USER_KEY), int)
+    return True
+
+
+def _has_metrics_token(token: str | None) -> bool:
+    if token is None or request.endpoint != METRICS_ENDPOINT:
+        return False
+    header = request.headers.get("Authorization", "")
+    scheme, _, credentials = header.partition(" ")
+    return scheme.lower() == "bearer" and secrets.compare_digest(
+        credentials.strip().encode(), token.encode()
+    )
 
 
 def login_required(view: Callable[..., T]) -> Callable[..., T]:
@@ -41,19 +66,71 @@ def login_required(view: Callable[..., T]) -> Callable[..., T]:
 
 
 def register_auth(app: Flask) -> None:
-    password_hash = _get_password_hash()
+    settings = get_settings()
+    multi_user = settings.multi_user
+    if multi_user:
+        from .accounts import get_user_by_username, shard_name
+        from .db import SHARD_IDLE_CHECK_INTERVAL, close_idle_shards, use_shard
+
+        password_hash = generate_password_hash(secrets.token_urlsafe(16))
+    else:
+        password_hash = _get_password_hash()
     app.secret_key = _get_secret_key()
-    app.permanent_session_lifetime = timedelta(days=get_session_days())
+    login_concurrency = settings.login_concurrency
+    login_queue = settings.login_queue
+    if settings.server_mode == "production":
+        # Each admitted login holds a request thread while it waits for its
+        # hash; keep at least one thread per worker for other requests.
+        admitted = min(login_concurrency + login_queue, max(1, settings.threads - 1))
+        login_concurrency = min(login_concurrency, admitted)
+        login_queue = admitted - login_concurrency
+    verifier = PasswordVerifier(login_concurrency, login_queue)
+    throttle = FailedLoginThrottle(
+        settings.login_max_failures, settings.login_window_seconds
+    )
+    throttle.init()
+    app.extensions["habit_log_login"] = {"verifier": verifier, "throttle": throttle}
+    app.permanent_session_lifetime = timedelta(days=settings.session_days)
     app.config["SESSION_COOKIE_HTTPONLY"] = True
     app.config["SESSION_COOKIE_SAMESITE"] = "Lax"
-    app.config["SESSION_COOKIE_SECURE"] = get_session_cookie_secure()
+    app.config["SESSION_COOKIE_SECURE"] = settings.session_cookie_secure
 
     @app.before_request
     def _enforce_auth():
         if request.endpoint in ("health", "login_form", "login_submit", "static"):
             return None
+        if _has_metrics_token(settings.metrics_token):
+            return None
         if not _is_authenticated():
+            if (
+                request.path.startswith(API_PATH_PREFIX)
+                or request.endpoint == METRICS_ENDPOINT
+            ):
+                return {"error": "Authentication required."}, 401
             return redirect(url_for("login_form", next=request.path))
+        if multi_user:
+            shard = ExitStack()
+            shard.enter_context(use_shard(shard_name(session[SESSION_USER_KEY])))
+            g.habit_log_shard = shard
+        return None
+
+    @app.teardown_request
+    def _release_shard(exc: BaseException | None) -> None:
+        shard = g.pop("habit_log_shard", None)
+        if shard is not None:
+            shard.close()
+            close_idle_shards(SHARD_IDLE_CHECK_INTERVAL)
+
+    def _verify_login(username: str, password: str) -> int | None:
+        if not multi_user:
+            return 0 if check_password_hash(password_hash, password) else None
+        user = get_user_by_username(username) if username else None
+        if user is None:
+            # Hash anyway so unknown usernames take as long as wrong passwords.
+            check_password_hash(password_hash, password)
+            return None
+        if check_password_hash(str(user["password_hash"]), password):
+            return int(user["id"])
         return None
 
     @app.get("/login")
@@ -64,30 +141,86 @@ def register_auth(app: Flask) -> None:
             error=None,
             next=request.args.get("next", ""),
             remember_device=True,
+            multi_user=multi_user,
+            username="",
+        )
+
+    def _login_failed(
+        error: str,
+        status: int,
+        next_url: str,
+        remember_device: bool,
+        username: str,
+        retry_after: int | None = None,
+    ):
+        response = app.make_response(
+            (
+                render_template(
+                    "login.html",
+                    already_authenticated=False,
+                    error=error,
+                    next=next_url,
+                    remember_device=remember_device,
+                    multi_user=multi_user,
+                    username=username,
+                ),
+                status,
+            )
         )
+        if retry_after is not None:
+            response.retry_after = retry_after
+        return response
 
     @app.post("/login")
     def login_submit():
+        username = request.form.get("username", "").strip()
         password = request.form.get("password", "")
         next_url = request.form.get("next", "")
         remember_device = request.form.get("remember_device") == "1"
         if not next_url.startswith("/"):
             next_url = "/login"
 
-        if check_password_hash(password_hash, password):
+        client = request.remote_addr or "unknown"
+        try:
+            attempt = throttle.begin(client)
+        except LoginThrottledError as exc:
+            return _login_failed(
+                f"Too many failed attempts. Try again in {exc.retry_after} seconds.",
+                429,
+                next_url,
+                remember_device,
+                username,
+                exc.retry_after,
+            )
+
+        try:
+            user_id = verifier.run(_verify_login, username, password)
+        except LoginBusyError:
+            throttle.cancel(attempt)
+            return _login_failed(
+                LOGIN_BUSY_ERROR,
+                503,
+                next_url,
+                remember_device,
+                username,
+                LOGIN_BUSY_RETRY_SECONDS,
+            )
+
+        if user_id is not None:
+            throttle.reset(client)
+            session.clear()
             session.permanent = remember_device
             session[SESSION_KEY] = True
+            if multi_user:
+                session[SESSION_USER_KEY] = user_id
             return redirect(next_url)
 
-        return (
-            render_template(
-                "login.html",
-                already_authenticated=False,
-                error="Invalid password.",
-                next=next_url,
-                remember_device=remember_device,
-            ),
+        return _login_failed(
+            MULTI_USER_LOGIN_ERROR if multi_user else LOGIN_ERROR,
             401,
+            next_url,
+            remember_device,
+            username,
         )
 
     @app.get("/logout")
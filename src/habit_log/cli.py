@@ -0,0 +1,388 @@
+from __future__ import annotations
+
+import argparse
+import getpass
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+from contextlib import AbstractContextManager, nullcontext
+from pathlib import Path
+
+from .export import EXPORT_FORMATS, EXPORT_TABLES
+
+IMPORTTIME_PATTERN = re.compile(
+    r"^import time:\s+(?P<self>\d+)\s+\|\s+(?P<cumulative>\d+)\s+\|\s+(?P<name>.+)$"
+)
+PROFILE_TOP_MODULES = 15
+
+
+def _current_rss_kb() -> int | None:
+    try:
+        with open("/proc/self/statm", encoding="ascii") as statm:
+            resident_pages = int(statm.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        try:
+            import resource
+        except ImportError:
+            return None
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return resident_pages * os.sysconf("SC_PAGE_SIZE") // 1024
+
+
+def _profile_imports(module: str) -> list[dict[str, object]]:
+    package_root = str(Path(__file__).resolve().parent.parent)
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        path for path in (package_root, env.get("PYTHONPATH")) if path
+    )
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    modules = []
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_PATTERN.match(line)
+        if match is None:
+            continue
+        modules.append(
+            {
+                "module": match["name"].strip(),
+                "self_ms": int(match["self"]) / 1000,
+                "cumulative_ms": int(match["cumulative"]) / 1000,
+            }
+        )
+    modules.sort(key=lambda entry: entry["cumulative_ms"], reverse=True)
+    return modules[:PROFILE_TOP_MODULES]
+
+
+def profile_startup() -> dict[str, object]:
+    report: dict[str, object] = {
+        "python": sys.version.split()[0],
+        "rss_kb_before_import": _current_rss_kb(),
+    }
+
+    started = time.perf_counter()
+    from .app import create_app
+
+    report["import_ms"] = (time.perf_counter() - started) * 1000
+    report["rss_kb_after_import"] = _current_rss_kb()
+    report["babel_loaded_after_import"] = "babel" in sys.modules
+
+    started = time.perf_counter()
+    create_app()
+    report["create_app_ms"] = (time.perf_counter() - started) * 1000
+    report["rss_kb_after_create_app"] = _current_rss_kb()
+    report["slowest_imports"] = _profile_imports(
+        f"{Path(__file__).resolve().parent.name}.app"
+    )
+    return report
+
+
+def _print_startup_report(report: dict[str, object]) -> None:
+    print("Startup profile")
+    print(f"  python:                  {report['python']}")
+    print(f"  import app:              {report['import_ms']:.1f} ms")
+    print(f"  create_app():            {report['create_app_ms']:.1f} ms")
+    print(f"  RSS before import:       {report['rss_kb_before_import']} KiB")
+    print(f"  RSS after import:        {report['rss_kb_after_import']} KiB")
+    print(f"  RSS after create_app():  {report['rss_kb_after_create_app']} KiB")
+    print(f"  Babel loaded at import:  {report['babel_loaded_after_import']}")
+    print("  Slowest imports (cumulative):")
+    for entry in report["slowest_imports"]:
+        print(
+            f"    {entry['cumulative_ms']:8.1f} ms  "
+            f"(self {entry['self_ms']:6.1f} ms)  {entry['module']}"
+        )
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="habit_log")
+    parser.add_argument(
+        "--profile-startup",
+        action="store_true",
+        help="Report import time, create_app() time and RSS, then exit.",
+    )
+    parser.add_argument(
+        "--json",
+        action="store_true",
+        help="Print the startup profile as JSON.",
+    )
+
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.add_parser("serve", help="Run the web application (default).")
+
+    export = subparsers.add_parser(
+        "export",
+        help="Stream daily_log and weekly_weight as CSV or NDJSON.",
+    )
+    export.add_argument("--format", choices=EXPORT_FORMATS, default="ndjson")
+    export.add_argument(
+        "--table",
+        default=None,
+        help="Comma-separated tables (CSV: exactly one; default daily_log).",
+    )
+    export.add_argument(
+        "--since",
+        default=None,
+        help="Only rows changed at or after this ISO date or datetime.",
+    )
+    export.add_argument("--output", "-o", default="-", help="File path or '-'.")
+    export.add_argument("--user", default=None, help="Account (multi-user mode).")
+
+    import_parser = subparsers.add_parser(
+        "import",
+        help="Bulk import daily_log and weekly_weight rows from CSV or NDJSON.",
+    )
+    import_parser.add_argument("input", help="File path or '-' for stdin.")
+    import_parser.add_argument(
+        "--format",
+        choices=EXPORT_FORMATS,
+        default=None,
+        help="Input format (default: inferred from the file name, else ndjson).",
+    )
+    import_parser.add_argument(
+        "--table",
+        choices=EXPORT_TABLES,
+        default="daily_log",
+        help="Table for CSV rows and NDJSON rows without a table field.",
+    )
+    import_parser.add_argument(
+        "--user", default=None, help="Account (multi-user mode)."
+    )
+
+    user = subparsers.add_parser("user", help="Manage accounts (multi-user mode).")
+    user_commands = user.add_subparsers(dest="user_command", required=True)
+    user_add = user_commands.add_parser("add", help="Create an account.")
+    user_add.add_argument("username")
+    user_add.add_argument(
+        "--password-stdin",
+        action="store_true",
+        help="Read the password from stdin instead of prompting.",
+    )
+    user_passwd = user_commands.add_parser("passwd", help="Change a password.")
+    user_passwd.add_argument("username")
+    user_passwd.add_argument("--password-stdin", action="store_true")
+    user_commands.add_parser("list", help="List accounts.")
+
+    profile = subparsers.add_parser(
+        "profile",
+        help="Switch request profiling and the slow query log on or off.",
+    )
+    profile_commands = profile.add_subparsers(dest="profile_command", required=True)
+    profile_on = profile_commands.add_parser("on", help="Start profiling.")
+    profile_on.add_argument(
+        "--sample-rate",
+        type=float,
+        default=0.05,
+        help="Fraction of requests to profile with cProfile (default: 0.05).",
+    )
+    profile_on.add_argument(
+        "--slow-query-ms",
+        type=float,
+        default=50.0,
+        help="Log SQLite statements slower than this (default: 50).",
+    )
+    profile_on.add_argument(
+        "--endpoint",
+        action="append",
+        default=[],
+        help="Only profile this endpoint, e.g. daily_log (repeatable).",
+    )
+    profile_on.add_argument(
+        "--minutes",
+        type=float,
+        default=30.0,
+        help="Switch off again after this long (0: until 'profile off').",
+    )
+    profile_commands.add_parser("off", help="Stop profiling.")
+    profile_commands.add_parser("status", help="Show the profiling settings.")
+    return parser
+
+
+def _user_database(username: str | None) -> AbstractContextManager[object]:
+    from .config import get_settings
+    from .db import init_db, use_shard
+
+    if not get_settings().multi_user:
+        if username is not None:
+            raise ValueError("--user requires HABIT_LOG_MULTI_USER=1.")
+        init_db()
+        return nullcontext()
+    if username is None:
+        raise ValueError("--user is required when HABIT_LOG_MULTI_USER=1.")
+
+    from .accounts import get_user_by_username, init_accounts, shard_name
+
+    init_accounts()
+    user = get_user_by_username(username)
+    if user is None:
+        raise ValueError(f"Unknown user {username!r}.")
+    return use_shard(shard_name(int(user["id"])))
+
+
+def run_export(args: argparse.Namespace) -> int:
+    from .export import ExportError, iter_export, parse_since, parse_tables
+
+    default_tables = ("daily_log",) if args.format == "csv" else EXPORT_TABLES
+    try:
+        tables = parse_tables(args.table, default=default_tables)
+        chunks = iter_export(args.format, tables, parse_since(args.since))
+    except ExportError as exc:
+        print(f"export: {exc}", file=sys.stderr)
+        return 2
+
+    try:
+        database = _user_database(args.user)
+    except ValueError as exc:
+        print(f"export: {exc}", file=sys.stderr)
+        return 2
+    with database:
+        if args.output == "-":
+            sys.stdout.writelines(chunks)
+            sys.stdout.flush()
+            return 0
+        with open(args.output, "w", encoding="utf-8", newline="") as output:
+            output.writelines(chunks)
+    return 0
+
+
+def run_import(args: argparse.Namespace) -> int:
+    from .importer import ImportFormatError, infer_format
+
+    import_format = args.format or infer_format(args.input)
+    try:
+        database = _user_database(args.user)
+    except ValueError as exc:
+        print(f"import: {exc}", file=sys.stderr)
+        return 2
+    try:
+        with database:
+            report = _import_input(args, import_format)
+    except (ImportFormatError, OSError) as exc:
+        print(f"import: {exc}", file=sys.stderr)
+        return 2
+
+    print(json.dumps(report, indent=2))
+    return 1 if report["rejected"] else 0
+
+
+def _import_input(args: argparse.Namespace, import_format: str) -> dict[str, object]:
+    from .importer import import_records
+
+    if args.input == "-":
+        sys.stdin.reconfigure(encoding="utf-8-sig", newline="")
+        return import_records(sys.stdin, import_format, table=args.table)
+    with open(args.input, encoding="utf-8-sig", newline="") as source:
+        return import_records(source, import_format, table=args.table)
+
+
+def _read_password(from_stdin: bool) -> str:
+    if from_stdin:
+        return sys.stdin.readline().rstrip("\n")
+    password = getpass.getpass("Password: ")
+    if password != getpass.getpass("Repeat password: "):
+        raise ValueError("Passwords do not match.")
+    return password
+
+
+def run_user(args: argparse.Namespace) -> int:
+    from werkzeug.security import generate_password_hash
+
+    from .accounts import (
+        AccountError,
+        create_user,
+        get_user_by_username,
+        init_accounts,
+        list_users,
+        set_password_hash,
+    )
+
+    init_accounts()
+    if args.user_command == "list":
+        for user in list_users():
+            print(f"{user['id']}\t{user['username']}\t{user['created_at']}")
+        return 0
+
+    try:
+        password = _read_password(args.password_stdin)
+        if not password:
+            raise ValueError("Password must not be empty.")
+        if args.user_command == "add":
+            user_id = create_user(args.username, generate_password_hash(password))
+            print(f"Created user {args.username!r} (id {user_id}).")
+            return 0
+        user = get_user_by_username(args.username)
+        if user is None:
+            raise AccountError(f"Unknown user {args.username!r}.")
+        set_password_hash(int(user["id"]), generate_password_hash(password))
+    except ValueError as exc:
+        print(f"user: {exc}", file=sys.stderr)
+        return 2
+    print(f"Updated password for {args.username!r}.")
+    return 0
+
+
+def run_profile(args: argparse.Namespace) -> int:
+    from .profiler import (
+        ProfilerError,
+        disable_profiling,
+        enable_profiling,
+        get_profiles_dir,
+        read_profiling_state,
+    )
+
+    try:
+        if args.profile_command == "on":
+            state = enable_profiling(
+                sample_rate=args.sample_rate,
+                slow_query_ms=args.slow_query_ms,
+                endpoints=tuple(args.endpoint),
+                minutes=args.minutes,
+            )
+        elif args.profile_command == "off":
+            print("Profiling off." if disable_profiling() else "Profiling was off.")
+            return 0
+        else:
+            state = read_profiling_state()
+    except (ProfilerError, RuntimeError) as exc:
+        print(f"profile: {exc}", file=sys.stderr)
+        return 2
+    report = {
+        "enabled": state is not None and state.is_active(time.time()),
+        "settings": state.snapshot() if state is not None else None,
+        "profiles_dir": str(get_profiles_dir()),
+    }
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = build_parser().parse_args(argv)
+
+    if args.profile_startup:
+        report = profile_startup()
+        if args.json:
+            print(json.dumps(report, indent=2))
+        else:
+            _print_startup_report(report)
+        return 0
+
+    if args.command == "export":
+        return run_export(args)
+    if args.command == "import":
+        return run_import(args)
+    if args.command == "user":
+        return run_user(args)
+    if args.command == "profile":
+        return run_profile(args)
+
+    from .app import run
+
+    run()
+    return 0
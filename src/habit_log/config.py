@@ -1,12 +1,80 @@
 from __future__ import annotations
 
 import os
+import threading
+from dataclasses import asdict, dataclass
 from pathlib import Path
 
 DEFAULT_DB_FILENAME = "habit-log.db"
 LOCAL_ENVS = {"local", "development", "dev"}
 _CONFIG_DEBUG_LOGGED = False
 DEFAULT_SESSION_DAYS = 30
+DEFAULT_RECENT_DAYS = 7
+MAX_RECENT_DAYS = 366
+STORAGE_MODES = {"rollback", "wal"}
+DEFAULT_STORAGE_MODE = "rollback"
+SERVER_MODES = {"development", "production"}
+DEFAULT_WORKERS = 2
+DEFAULT_THREADS = 4
+DEFAULT_KEEPALIVE_SECONDS = 5
+DEFAULT_GRACEFUL_TIMEOUT_SECONDS = 30
+DEFAULT_MAX_OPEN_SHARDS = 64
+DEFAULT_SHARD_IDLE_SECONDS = 300
+DEFAULT_LOGIN_CONCURRENCY = 2
+DEFAULT_LOGIN_MAX_FAILURES = 5
+DEFAULT_LOGIN_WINDOW_SECONDS = 300
+DEFAULT_MAX_UPLOAD_BYTES = 16 * 1024 * 1024
+ACCOUNTS_DB_FILENAME = "accounts.db"
+LOGIN_THROTTLE_DB_FILENAME = "login-throttle.db"
+SHARDS_DIRNAME = "users"
+REDACTED_SETTINGS = {"password_hash", "secret_key", "metrics_token"}
+
+
+@dataclass(frozen=True)
+class Settings:
+    app_env: str
+    data_dir: Path | None
+    db_path: str | None
+    bind_host: str
+    bind_port: int
+    password_hash: str | None
+    secret_key: str | None
+    session_days: int
+    session_cookie_secure: bool
+    recent_days: int
+    storage_mode: str
+    server_mode: str
+    workers: int
+    threads: int
+    keepalive_seconds: int
+    graceful_timeout_seconds: int
+    startup_diagnostics: bool
+    multi_user: bool
+    max_open_shards: int
+    shard_idle_seconds: int
+    login_concurrency: int
+    login_queue: int
+    trusted_proxies: int
+    login_max_failures: int
+    login_window_seconds: int
+    max_upload_bytes: int
+    metrics_enabled: bool
+    metrics_token: str | None
+
+    @property
+    def is_local(self) -> bool:
+        return self.app_env.lower() in LOCAL_ENVS
+
+    def snapshot(self) -> dict[str, object]:
+        values = asdict(self)
+        for name in REDACTED_SETTINGS:
+            values[name] = "<set>" if values[name] else None
+        values["data_dir"] = str(self.data_dir) if self.data_dir else None
+        return values
+
+
+_SETTINGS: Settings | None = None
+_SETTINGS_LOCK = threading.Lock()
 
 
 def _log_config(app_env: str, data_dir: str | None, db_path: str) -> None:
@@ -35,69 +103,242 @@ def _get_env_bool(name: str) -> bool | None:
     return value.lower() in {"1", "true", "yes", "on"}
 
 
-def get_app_env() -> str:
-    return _get_env("APP_ENV") or _get_env("HABIT_LOG_ENV") or "local"
+def _get_env_positive_int(name: str, default: int) -> int:
+    value = _get_env(name)
+    if value is None:
+        return default
+    number = int(value)
+    if number < 1:
+        raise RuntimeError(f"{name} must be a positive integer.")
+    return number
 
 
-def is_local_env() -> bool:
-    return get_app_env().lower() in LOCAL_ENVS
+def _get_env_non_negative_int(name: str, default: int) -> int:
+    value = _get_env(name)
+    if value is None:
+        return default
+    number = int(value)
+    if number < 0:
+        raise RuntimeError(f"{name} must be zero or a positive integer.")
+    return number
 
 
-def get_data_dir() -> Path:
+def _resolve_login_queue(threads: int, login_concurrency: int) -> int:
+    # By default only as many logins wait as leave one request thread free.
+    return _get_env_non_negative_int(
+        "HABIT_LOG_LOGIN_QUEUE", max(0, threads - 1 - login_concurrency)
+    )
+
+
+def _get_env_choice(name: str, choices: set[str], default: str) -> str:
+    value = (_get_env(name) or default).lower()
+    if value not in choices:
+        raise RuntimeError(
+            f"{name} must be one of: " + ", ".join(sorted(choices)) + "."
+        )
+    return value
+
+
+def _resolve_data_dir(app_env: str) -> Path | None:
     data_dir = _get_env("DATA_DIR") or _get_env("HABIT_LOG_DATA_DIR")
     if data_dir:
         return Path(data_dir)
-    if is_local_env():
+    if app_env.lower() in LOCAL_ENVS:
         return Path.cwd() / ".data"
-    raise RuntimeError("DATA_DIR is required when APP_ENV is not local.")
+    return None
 
 
-def get_db_path() -> str:
-    app_env = get_app_env()
+def _resolve_recent_days() -> int:
+    recent_days = _get_env_positive_int("HABIT_LOG_RECENT_DAYS", DEFAULT_RECENT_DAYS)
+    if recent_days > MAX_RECENT_DAYS:
+        raise RuntimeError(
+            f"HABIT_LOG_RECENT_DAYS must be between 1 and {MAX_RECENT_DAYS}."
+        )
+    return recent_days
+
+
+def load_settings() -> Settings:
+    app_env = _get_env("APP_ENV") or _get_env("HABIT_LOG_ENV") or "local"
+    is_local = app_env.lower() in LOCAL_ENVS
+    data_dir = _resolve_data_dir(app_env)
     db_path = _get_env("HABIT_LOG_DB_PATH")
-    if db_path:
-        data_dir = _get_env("DATA_DIR") or _get_env("HABIT_LOG_DATA_DIR")
-        if not data_dir and app_env.lower() in LOCAL_ENVS:
-            data_dir = str(Path.cwd() / ".data")
-        _log_config(app_env, data_dir, db_path)
-        return db_path
-    data_dir_path = get_data_dir()
-    db_path = str(data_dir_path / DEFAULT_DB_FILENAME)
-    _log_config(app_env, str(data_dir_path), db_path)
+    if not db_path and data_dir is not None:
+        db_path = str(data_dir / DEFAULT_DB_FILENAME)
+    startup_diagnostics = bool(_get_env_bool("HABIT_LOG_STARTUP_DIAGNOSTICS"))
+    if db_path and startup_diagnostics:
+        _log_config(app_env, str(data_dir) if data_dir else None, db_path)
+
+    session_days = _get_env("HABIT_LOG_SESSION_DAYS")
+    threads = _get_env_positive_int("HABIT_LOG_THREADS", DEFAULT_THREADS)
+    login_concurrency = _get_env_positive_int(
+        "HABIT_LOG_LOGIN_CONCURRENCY", DEFAULT_LOGIN_CONCURRENCY
+    )
+    return Settings(
+        app_env=app_env,
+        data_dir=data_dir,
+        db_path=db_path,
+        bind_host=_get_env("HABIT_LOG_HOST") or "0.0.0.0",
+        bind_port=int(_get_env("HABIT_LOG_PORT") or "10021"),
+        password_hash=_get_env("HABIT_LOG_PASSWORD_HASH"),
+        secret_key=_get_env("HABIT_LOG_SECRET_KEY"),
+        session_days=(
+            int(session_days) if session_days is not None else DEFAULT_SESSION_DAYS
+        ),
+        session_cookie_secure=bool(_get_env_bool("HABIT_LOG_SESSION_COOKIE_SECURE")),
+        recent_days=_resolve_recent_days(),
+        storage_mode=_get_env_choice(
+            "HABIT_LOG_STORAGE_MODE", STORAGE_MODES, DEFAULT_STORAGE_MODE
+        ),
+        server_mode=_get_env_choice(
+            "HABIT_LOG_SERVER",
+            SERVER_MODES,
+            "development" if is_local else "production",
+        ),
+        workers=_get_env_positive_int("HABIT_LOG_WORKERS", DEFAULT_WORKERS),
+        threads=threads,
+        keepalive_seconds=_get_env_positive_int(
+            "HABIT_LOG_KEEPALIVE", DEFAULT_KEEPALIVE_SECONDS
+        ),
+        graceful_timeout_seconds=_get_env_positive_int(
+            "HABIT_LOG_GRACEFUL_TIMEOUT", DEFAULT_GRACEFUL_TIMEOUT_SECONDS
+        ),
+        startup_diagnostics=startup_diagnostics,
+        multi_user=bool(_get_env_bool("HABIT_LOG_MULTI_USER")),
+        max_open_shards=_get_env_positive_int(
+            "HABIT_LOG_MAX_OPEN_SHARDS", DEFAULT_MAX_OPEN_SHARDS
+        ),
+        shard_idle_seconds=_get_env_positive_int(
+            "HABIT_LOG_SHARD_IDLE_SECONDS", DEFAULT_SHARD_IDLE_SECONDS
+        ),
+        login_concurrency=login_concurrency,
+        login_queue=_resolve_login_queue(threads, login_concurrency),
+        trusted_proxies=_get_env_non_negative_int("HABIT_LOG_TRUSTED_PROXIES", 0),
+        login_max_failures=_get_env_positive_int(
+            "HABIT_LOG_LOGIN_MAX_FAILURES", DEFAULT_LOGIN_MAX_FAILURES
+        ),
+        login_window_seconds=_get_env_positive_int(
+            "HABIT_LOG_LOGIN_WINDOW_SECONDS", DEFAULT_LOGIN_WINDOW_SECONDS
+        ),
+        max_upload_bytes=_get_env_positive_int(
+            "HABIT_LOG_MAX_UPLOAD_BYTES", DEFAULT_MAX_UPLOAD_BYTES
+        ),
+        metrics_enabled=_get_env_bool("HABIT_LOG_METRICS") is not False,
+        metrics_token=_get_env("HABIT_LOG_METRICS_TOKEN"),
+    )
+
+
+def get_settings() -> Settings:
+    global _SETTINGS
+    settings = _SETTINGS
+    if settings is not None:
+        return settings
+    with _SETTINGS_LOCK:
+        if _SETTINGS is None:
+            _SETTINGS = load_settings()
+        return _SETTINGS
+
+
+def reload_settings() -> Settings:
+    global _SETTINGS
+    with _SETTINGS_LOCK:
+        _SETTINGS = load_settings()
+        return _SETTINGS
+
+
+def get_app_env() -> str:
+    return get_settings().app_env
+
+
+def is_local_env() -> bool:
+    return get_settings().is_local
+
+
+def get_data_dir() -> Path:
+    data_dir = get_settings().data_dir
+    if data_dir is None:
+        raise RuntimeError("DATA_DIR is required when APP_ENV is not local.")
+    return data_dir
+
+
+def get_db_path() -> str:
+    db_path = get_settings().db_path
+    if db_path is None:
+        raise RuntimeError("DATA_DIR is required when APP_ENV is not local.")
     return db_path
 
 
 def get_bind_host() -> str:
-    return _get_env("HABIT_LOG_HOST") or "0.0.0.0"
+    return get_settings().bind_host
 
 
 def get_bind_port() -> int:
-    return int(_get_env("HABIT_LOG_PORT") or "10021")
+    return get_settings().bind_port
+
+
+def is_multi_user() -> bool:
+    return get_settings().multi_user
+
+
+def get_accounts_db_path() -> str:
+    return str(get_data_dir() / ACCOUNTS_DB_FILENAME)
+
+
+def get_login_throttle_db_path() -> str:
+    data_dir = get_settings().data_dir
+    if data_dir is None:
+        return str(Path(get_db_path()).with_name(LOGIN_THROTTLE_DB_FILENAME))
+    return str(data_dir / LOGIN_THROTTLE_DB_FILENAME)
+
+
+def get_shards_dir() -> Path:
+    return get_data_dir() / SHARDS_DIRNAME
 
 
 def get_password_hash() -> str:
-    password_hash = _get_env("HABIT_LOG_PASSWORD_HASH")
+    password_hash = get_settings().password_hash
     if not password_hash:
         raise RuntimeError("HABIT_LOG_PASSWORD_HASH is required for authentication.")
     return password_hash
 
 
 def get_secret_key() -> str:
-    secret_key = _get_env("HABIT_LOG_SECRET_KEY")
+    secret_key = get_settings().secret_key
     if not secret_key:
         raise RuntimeError("HABIT_LOG_SECRET_KEY is required for sessions.")
     return secret_key
 
 
 def get_session_days() -> int:
-    session_days = _get_env("HABIT_LOG_SESSION_DAYS")
-    if session_days is None:
-        return DEFAULT_SESSION_DAYS
-    return int(session_days)
+    return get_settings().session_days
 
 
 def get_session_cookie_secure() -> bool:
-    secure = _get_env_bool("HABIT_LOG_SESSION_COOKIE_SECURE")
-    if secure is None:
-        return False
-    return secure
+    return get_settings().session_cookie_secure
+
+
+def get_recent_days() -> int:
+    return get_settings().recent_days
+
+
+def get_storage_mode() -> str:
+    return get_settings().storage_mode
+
+
+def get_server_mode() -> str:
+    return get_settings().server_mode
+
+
+def get_workers() -> int:
+    return get_settings().workers
+
+
+def get_threads() -> int:
+    return get_settings().threads
+
+
+def get_keepalive_seconds() -> int:
+    return get_settings().keepalive_seconds
+
+
+def get_graceful_timeout_seconds() -> int:
+    return get_settings().graceful_timeout_seconds
@@ -0,0 +1,135 @@
+from __future__ import annotations
+
+import datetime as dt
+import threading
+from collections import OrderedDict
+
+from .db import (
+    MAX_CACHED_SHARDS,
+    get_habit_masks,
+    get_revision,
+    get_shard_key,
+    in_transaction,
+)
+
+WALKED = 1
+NO_ALCOHOL_AFTER_21 = 2
+FOOD_RESPECTED = 4
+SPECIAL_OCCASION = 8
+ALL_HABITS = WALKED | NO_ALCOHOL_AFTER_21 | FOOD_RESPECTED
+PRESENT = 16
+
+STATUS_MISSING = 0
+STATUS_GREEN = 1
+STATUS_ORANGE = 2
+STATUS_RED = 3
+STATUS_NAMES = ("red", "green", "orange", "red")
+
+
+def status_from_mask(mask: int) -> int:
+    if not mask & PRESENT:
+        return STATUS_MISSING
+    if mask & ALL_HABITS == ALL_HABITS:
+        return STATUS_GREEN
+    if mask & SPECIAL_OCCASION:
+        return STATUS_ORANGE
+    return STATUS_RED
+
+
+STATUS_TABLE = bytes(status_from_mask(mask) for mask in range(256))
+
+
+class DayStatusBitmap:
+    def __init__(self, first_ordinal: int, masks: bytearray) -> None:
+        self.first_ordinal = first_ordinal
+        self.masks = masks
+        self.statuses = bytes(masks.translate(STATUS_TABLE))
+
+    @classmethod
+    def from_rows(cls, rows: list[tuple[int, int]]) -> DayStatusBitmap:
+        if not rows:
+            return cls(dt.date.today().toordinal(), bytearray())
+        first_ordinal = rows[0][0]
+        masks = bytearray(rows[-1][0] - first_ordinal + 1)
+        for ordinal, mask in rows:
+            masks[ordinal - first_ordinal] = mask | PRESENT
+        return cls(first_ordinal, masks)
+
+    def __len__(self) -> int:
+        return len(self.masks)
+
+    @property
+    def first_day(self) -> dt.date:
+        return dt.date.fromordinal(self.first_ordinal)
+
+    def _index(self, day: dt.date) -> int:
+        return day.toordinal() - self.first_ordinal
+
+    def _bounds(self, start: dt.date, end: dt.date) -> tuple[int, int]:
+        lower = max(self._index(start), 0)
+        upper = min(self._index(end) + 1, len(self.statuses))
+        return lower, max(upper, lower)
+
+    def mask(self, day: dt.date) -> int:
+        index = self._index(day)
+        if 0 <= index < len(self.masks):
+            return self.masks[index]
+        return 0
+
+    def status(self, day: dt.date) -> int:
+        index = self._index(day)
+        if 0 <= index < len(self.statuses):
+            return self.statuses[index]
+        return STATUS_MISSING
+
+    def status_name(self, day: dt.date) -> str:
+        return STATUS_NAMES[self.status(day)]
+
+    def statuses_between(self, start: dt.date, end: dt.date) -> bytes:
+        days = (end - start).days + 1
+        if days <= 0:
+            return b""
+        lower, upper = self._bounds(start, end)
+        leading = min(max(-self._index(start), 0), days)
+        window = self.statuses[lower:upper]
+        trailing = days - leading - len(window)
+        return bytes(leading) + window + bytes(trailing)
+
+    def count(self, status: int, start: dt.date, end: dt.date) -> int:
+        lower, upper = self._bounds(start, end)
+        count = self.statuses.count(status, lower, upper)
+        if status == STATUS_MISSING:
+            count += (end - start).days + 1 - (upper - lower)
+        return count
+
+    def streak_ending(self, day: dt.date, status: int = STATUS_GREEN) -> int:
+        index = self._index(day)
+        if index < 0 or index >= len(self.statuses):
+            return 0
+        window = self.statuses[: index + 1]
+        return len(window) - len(window.rstrip(bytes((status,))))
+
+
+_CACHE: OrderedDict[str, tuple[int, DayStatusBitmap]] = OrderedDict()
+_CACHE_LOCK = threading.Lock()
+
+
+def get_day_status_bitmap() -> DayStatusBitmap:
+    if in_transaction():
+        return DayStatusBitmap.from_rows(get_habit_masks())
+
+    shard = get_shard_key()
+    revision = get_revision("daily_log")
+    cached = _CACHE.get(shard)
+    if cached is not None and cached[0] == revision:
+        return cached[1]
+    with _CACHE_LOCK:
+        cached = _CACHE.get(shard)
+        if cached is not None and cached[0] == revision:
+            return cached[1]
+        bitmap = DayStatusBitmap.from_rows(get_habit_masks())
+        _CACHE[shard] = (revision, bitmap)
+        _CACHE.move_to_end(shard)
+        while len(_CACHE) > MAX_CACHED_SHARDS:
+            _CACHE.popitem(last=False)
+        return bitmap
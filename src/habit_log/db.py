@@ -1,25 +1,638 @@
 from __future__ import annotations
 
+import atexit
 import datetime as dt
 import grp
 import os
 import pwd
+import re
 import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import AbstractContextManager, contextmanager
+from contextvars import ContextVar
+from itertools import islice
 from pathlib import Path
+from typing import (
+    Callable,
+    Iterable,
+    Iterator,
+    Mapping,
+    NamedTuple,
+    Sequence,
+    TypeVar,
+)
+from urllib.parse import quote
 
-from .config import get_db_path as _get_db_path
+from .config import get_db_path as _get_db_path, get_settings, get_shards_dir
+from .metrics import timed
 
-SCHEMA_VERSION = 1
+T = TypeVar("T")
+
+BASE_SCHEMA_VERSION = 1
+SCHEMA_VERSION = 6
+MIGRATIONS_DIR = Path(__file__).with_name("migrations")
+MIGRATION_FILENAME = re.compile(r"^(?P<version>\d{4})_(?P<name>\w+)\.sql$")
+POOL_HEALTH_CHECK_INTERVAL = 30.0
+MAX_CACHED_SHARDS = 64
+SHARD_IDLE_CHECK_INTERVAL = 30.0
+CONNECTION_PRAGMAS = (
+    "PRAGMA foreign_keys = ON",
+    "PRAGMA busy_timeout = 5000",
+    "PRAGMA temp_store = MEMORY",
+)
+JOURNAL_MODES = {"rollback": "DELETE", "wal": "WAL"}
+STORAGE_MODE_PRAGMAS = {
+    "rollback": (),
+    "wal": (
+        "PRAGMA synchronous = NORMAL",
+        "PRAGMA mmap_size = 268435456",
+        "PRAGMA cache_size = -16000",
+    ),
+}
 
 
 def get_db_path() -> str:
     return _get_db_path()
 
 
-def _connect() -> sqlite3.Connection:
-    conn = sqlite3.connect(get_db_path())
-    conn.row_factory = sqlite3.Row
-    return conn
+class ConnectionPool:
+    def __init__(self, db_path: str, storage_mode: str = "rollback") -> None:
+        self.db_path = db_path
+        self.storage_mode = storage_mode
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._generation = 0
+        self._readers: dict[int, tuple[threading.Thread, sqlite3.Connection]] = {}
+        self._writer: sqlite3.Connection | None = None
+        self._writer_lock = threading.RLock()
+        self._writer_last_used = 0.0
+        self._stats = {
+            "opened": 0,
+            "reused": 0,
+            "closed": 0,
+            "health_check_failures": 0,
+            "writer_acquired": 0,
+        }
+
+    def acquire(self) -> sqlite3.Connection:
+        if getattr(self._local, "writer_depth", 0):
+            return self._writer
+
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.generation == self._generation:
+            now = time.monotonic()
+            if now - self._local.last_used < POOL_HEALTH_CHECK_INTERVAL or (
+                self._is_healthy(conn)
+            ):
+                self._local.last_used = now
+                with self._lock:
+                    self._stats["reused"] += 1
+                return conn
+            with self._lock:
+                self._stats["health_check_failures"] += 1
+            self._discard_reader(threading.get_ident())
+        return self._open_reader()
+
+    @contextmanager
+    def writer(self) -> Iterator[sqlite3.Connection]:
+        with self._writer_lock:
+            conn = self._ensure_writer()
+            depth = getattr(self._local, "writer_depth", 0)
+            self._local.writer_depth = depth + 1
+            with self._lock:
+                self._stats["writer_acquired"] += 1
+            try:
+                yield conn
+            finally:
+                self._local.writer_depth = depth
+                self._writer_last_used = time.monotonic()
+
+    def holds_writer(self) -> bool:
+        return bool(getattr(self._local, "writer_depth", 0))
+
+    def _ensure_writer(self) -> sqlite3.Connection:
+        with self._writer_lock:
+            conn = self._writer
+            if conn is not None:
+                idle = time.monotonic() - self._writer_last_used
+                if idle < POOL_HEALTH_CHECK_INTERVAL or self._is_healthy(conn):
+                    return conn
+                with self._lock:
+                    self._stats["health_check_failures"] += 1
+                    self._close_connection(conn)
+
+            conn = self._open_connection(self.db_path)
+            conn.execute(
+                f"PRAGMA journal_mode = {JOURNAL_MODES[self.storage_mode]}"
+            ).fetchone()
+            self._writer = conn
+            self._writer_last_used = time.monotonic()
+            return conn
+
+    def discard_writer(self) -> None:
+        with self._writer_lock, self._lock:
+            if self._writer is not None:
+                self._close_connection(self._writer)
+                self._writer = None
+
+    def _open_connection(self, database: str, uri: bool = False) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            database,
+            uri=uri,
+            check_same_thread=False,
+            isolation_level=None,
+        )
+        conn.row_factory = sqlite3.Row
+        if _STATEMENT_TRACER is not None:
+            conn.set_trace_callback(_STATEMENT_TRACER)
+        for pragma in CONNECTION_PRAGMAS + STORAGE_MODE_PRAGMAS[self.storage_mode]:
+            conn.execute(pragma)
+        with self._lock:
+            self._stats["opened"] += 1
+        return conn
+
+    def _open_reader(self) -> sqlite3.Connection:
+        if self._writer is None:
+            self._ensure_writer()
+        db_uri = f"file:{quote(Path(self.db_path).as_posix())}?mode=ro"
+        conn = self._open_connection(db_uri, uri=True)
+
+        thread = threading.current_thread()
+        with self._lock:
+            self._reap_dead_threads()
+            self._readers[thread.ident] = (thread, conn)
+            self._local.generation = self._generation
+        self._local.conn = conn
+        self._local.last_used = time.monotonic()
+        return conn
+
+    @contextmanager
+    def snapshot(self) -> Iterator[sqlite3.Connection]:
+        if self._writer is None:
+            self._ensure_writer()
+        db_uri = f"file:{quote(Path(self.db_path).as_posix())}?mode=ro"
+        conn = self._open_connection(db_uri, uri=True)
+        try:
+            conn.execute("BEGIN")
+            yield conn
+        finally:
+            _flush_statements()
+            with self._lock:
+                self._close_connection(conn)
+
+    def _is_healthy(self, conn: sqlite3.Connection) -> bool:
+        try:
+            conn.execute("SELECT 1").fetchone()
+        except sqlite3.Error:
+            return False
+        return True
+
+    def _reap_dead_threads(self) -> None:
+        dead = [
+            ident
+            for ident, (thread, _) in self._readers.items()
+            if not thread.is_alive()
+        ]
+        for ident in dead:
+            _, conn = self._readers.pop(ident)
+            self._close_connection(conn)
+
+    def _discard_reader(self, ident: int) -> None:
+        with self._lock:
+            entry = self._readers.pop(ident, None)
+            if entry is not None:
+                self._close_connection(entry[1])
+        self._local.conn = None
+
+    def _close_connection(self, conn: sqlite3.Connection) -> None:
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        self._stats["closed"] += 1
+
+    def close(self) -> None:
+        with self._writer_lock, self._lock:
+            self._generation += 1
+            for _, conn in self._readers.values():
+                self._close_connection(conn)
+            self._readers.clear()
+            if self._writer is not None:
+                self._close_connection(self._writer)
+                self._writer = None
+
+    def set_trace_callback(self, callback: Callable[[str], None] | None) -> None:
+        with self._lock:
+            connections = [conn for _, conn in self._readers.values()]
+            if self._writer is not None:
+                connections.append(self._writer)
+            for conn in connections:
+                conn.set_trace_callback(callback)
+
+    def stats(self) -> dict[str, object]:
+        with self._lock:
+            return {
+                "db_path": self.db_path,
+                "storage_mode": self.storage_mode,
+                "readers_open": len(self._readers),
+                "writer_open": self._writer is not None,
+                **self._stats,
+            }
+
+
+class _Shard:
+    def __init__(self, pool: ConnectionPool) -> None:
+        self.pool = pool
+        self.leases = 0
+        self.last_used = time.monotonic()
+        self.initialized = False
+        self.init_lock = threading.Lock()
+
+
+class ShardRouter:
+    def __init__(
+        self,
+        shard_dir: Path,
+        storage_mode: str,
+        max_open: int,
+        idle_seconds: float,
+    ) -> None:
+        self.shard_dir = shard_dir
+        self.storage_mode = storage_mode
+        self.max_open = max_open
+        self.idle_seconds = idle_seconds
+        self._shards: OrderedDict[str, _Shard] = OrderedDict()
+        self._lock = threading.Lock()
+        self._idle_checked_at = time.monotonic()
+        self._stats = {"opened": 0, "reused": 0, "closed": 0}
+
+    def shard_path(self, name: str) -> Path:
+        return self.shard_dir / f"{name}.db"
+
+    @contextmanager
+    def lease(self, name: str) -> Iterator[ConnectionPool]:
+        shard = self._checkout(name)
+        try:
+            if not shard.initialized:
+                self._initialize(shard)
+            token = _BOUND_POOL.set(shard.pool)
+            try:
+                yield shard.pool
+            finally:
+                _BOUND_POOL.reset(token)
+        finally:
+            with self._lock:
+                shard.leases -= 1
+                shard.last_used = time.monotonic()
+
+    def _initialize(self, shard: _Shard) -> None:
+        with shard.init_lock:
+            if not shard.initialized:
+                self.shard_dir.mkdir(parents=True, exist_ok=True)
+                _initialize_pool(shard.pool)
+                shard.initialized = True
+
+    def _checkout(self, name: str) -> _Shard:
+        with self._lock:
+            shard = self._shards.get(name)
+            if shard is None:
+                pool = ConnectionPool(str(self.shard_path(name)), self.storage_mode)
+                shard = self._shards[name] = _Shard(pool)
+                self._stats["opened"] += 1
+            else:
+                self._shards.move_to_end(name)
+                self._stats["reused"] += 1
+            shard.leases += 1
+            shard.last_used = time.monotonic()
+            evicted = self._collect_evictions(shard.last_used)
+
+        for stale in evicted:
+            stale.pool.close()
+        return shard
+
+    def _collect_evictions(self, now: float) -> list[_Shard]:
+        evicted = []
+        open_count = len(self._shards)
+        for name, shard in list(self._shards.items()):
+            over_limit = open_count > self.max_open
+            if not over_limit and now - shard.last_used < self.idle_seconds:
+                break
+            if shard.leases:
+                continue
+            del self._shards[name]
+            evicted.append(shard)
+            open_count -= 1
+            self._stats["closed"] += 1
+        return evicted
+
+    def pools(self) -> list[ConnectionPool]:
+        with self._lock:
+            return [shard.pool for shard in self._shards.values()]
+
+    def close_idle(self, min_interval: float = 0.0) -> int:
+        now = time.monotonic()
+        with self._lock:
+            if now - self._idle_checked_at < min_interval:
+                return 0
+            self._idle_checked_at = now
+            evicted = self._collect_evictions(now)
+        for shard in evicted:
+            shard.pool.close()
+        return len(evicted)
+
+    def close(self) -> None:
+        with self._lock:
+            shards = list(self._shards.values())
+            self._shards.clear()
+        for shard in shards:
+            shard.pool.close()
+
+    def stats(self) -> dict[str, object]:
+        with self._lock:
+            return {
+                "shard_dir": str(self.shard_dir),
+                "shards_open": len(self._shards),
+                "shards_leased": sum(
+                    1 for shard in self._shards.values() if shard.leases
+                ),
+                "max_open": self.max_open,
+                **self._stats,
+            }
+
+
+_POOL: ConnectionPool | None = None
+_POOL_LOCK = threading.Lock()
+_INHERITED_POOLS: list[ConnectionPool] = []
+_NAMED_POOLS: dict[str, ConnectionPool] = {}
+_ROUTER: ShardRouter | None = None
+_INHERITED_ROUTERS: list[ShardRouter] = []
+_BOUND_POOL: ContextVar[ConnectionPool | None] = ContextVar(
+    "habit_log_bound_pool", default=None
+)
+_STATEMENT_TRACER: Callable[[str], None] | None = None
+_STATEMENT_FLUSH: Callable[[], None] | None = None
+
+
+def _get_pool() -> ConnectionPool:
+    global _POOL
+    bound = _BOUND_POOL.get()
+    if bound is not None:
+        return bound
+    settings = get_settings()
+    pool = _POOL
+    if (
+        pool is not None
+        and pool.db_path == settings.db_path
+        and pool.storage_mode == settings.storage_mode
+    ):
+        return pool
+    with _POOL_LOCK:
+        stale = _POOL
+        if (
+            stale is not None
+            and stale.db_path == settings.db_path
+            and stale.storage_mode == settings.storage_mode
+        ):
+            return stale
+        _POOL = ConnectionPool(get_db_path(), settings.storage_mode)
+        pool = _POOL
+    if stale is not None:
+        stale.close()
+    return pool
+
+
+def get_named_pool(name: str, db_path: str) -> ConnectionPool:
+    storage_mode = get_settings().storage_mode
+    pool = _NAMED_POOLS.get(name)
+    if (
+        pool is not None
+        and pool.db_path == db_path
+        and pool.storage_mode == storage_mode
+    ):
+        return pool
+    with _POOL_LOCK:
+        stale = _NAMED_POOLS.get(name)
+        if (
+            stale is not None
+            and stale.db_path == db_path
+            and stale.storage_mode == storage_mode
+        ):
+            return stale
+        pool = _NAMED_POOLS[name] = ConnectionPool(db_path, storage_mode)
+    if stale is not None:
+        stale.close()
+    return pool
+
+
+def close_named_pool(name: str) -> None:
+    with _POOL_LOCK:
+        pool = _NAMED_POOLS.pop(name, None)
+    if pool is not None:
+        pool.close()
+
+
+def _get_router() -> ShardRouter:
+    global _ROUTER
+    settings = get_settings()
+    shard_dir = get_shards_dir()
+    router = _ROUTER
+    if (
+        router is not None
+        and router.shard_dir == shard_dir
+        and router.storage_mode == settings.storage_mode
+    ):
+        return router
+    with _POOL_LOCK:
+        stale = _ROUTER
+        if (
+            stale is not None
+            and stale.shard_dir == shard_dir
+            and stale.storage_mode == settings.storage_mode
+        ):
+            return stale
+        _ROUTER = ShardRouter(
+            shard_dir,
+            settings.storage_mode,
+            settings.max_open_shards,
+            settings.shard_idle_seconds,
+        )
+        router = _ROUTER
+    if stale is not None:
+        stale.close()
+    return router
+
+
+def use_shard(name: str) -> AbstractContextManager[ConnectionPool]:
+    return _get_router().lease(name)
+
+
+def iter_in_current_database(chunks: Iterable[T]) -> Iterator[T]:
+    bound = _BOUND_POOL.get()
+    if bound is None:
+        return iter(chunks)
+    return _iter_in_shard(Path(bound.db_path).stem, chunks)
+
+
+def _iter_in_shard(name: str, chunks: Iterable[T]) -> Iterator[T]:
+    with use_shard(name):
+        yield from chunks
+
+
+def get_shard_key() -> str:
+    return _get_pool().db_path
+
+
+def close_idle_shards(min_interval: float = 0.0) -> int:
+    router = _ROUTER
+    return router.close_idle(min_interval) if router is not None else 0
+
+
+def get_shard_stats() -> dict[str, object]:
+    router = _ROUTER
+    if router is None:
+        return {"shards_open": 0, "shards_leased": 0}
+    return router.stats()
+
+
+def close_pool() -> None:
+    global _POOL, _ROUTER
+    with _POOL_LOCK:
+        pool = _POOL
+        router = _ROUTER
+        named = list(_NAMED_POOLS.values())
+        _POOL = None
+        _ROUTER = None
+        _NAMED_POOLS.clear()
+    if pool is not None:
+        pool.close()
+    for stale in named:
+        stale.close()
+    if router is not None:
+        router.close()
+
+
+def _reset_pool_after_fork() -> None:
+    global _POOL, _POOL_LOCK, _ROUTER
+    if _POOL is not None:
+        # Connections inherited from the parent must never be used or closed
+        # by the child; keep them referenced so garbage collection leaves
+        # them alone.
+        _INHERITED_POOLS.append(_POOL)
+    _INHERITED_POOLS.extend(_NAMED_POOLS.values())
+    _NAMED_POOLS.clear()
+    if _ROUTER is not None:
+        _INHERITED_ROUTERS.append(_ROUTER)
+    _POOL = None
+    _ROUTER = None
+    _POOL_LOCK = threading.Lock()
+
+
+def get_pool_stats() -> dict[str, object]:
+    pool = _POOL
+    if pool is None:
+        return {"db_path": None, "readers_open": 0, "writer_open": False}
+    return pool.stats()
+
+
+atexit.register(close_pool)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_pool_after_fork)
+
+
+def set_statement_tracer(
+    trace: Callable[[str], None] | None,
+    flush: Callable[[], None] | None = None,
+) -> None:
+    global _STATEMENT_TRACER, _STATEMENT_FLUSH
+    _STATEMENT_TRACER = trace
+    _STATEMENT_FLUSH = flush if trace is not None else None
+    pools = [_POOL] + (_ROUTER.pools() if _ROUTER is not None else [])
+    for pool in pools:
+        if pool is not None:
+            pool.set_trace_callback(trace)
+
+
+def _flush_statements() -> None:
+    flush = _STATEMENT_FLUSH
+    if flush is not None:
+        flush()
+
+
+@contextmanager
+def _connect() -> Iterator[sqlite3.Connection]:
+    try:
+        yield _get_pool().acquire()
+    finally:
+        _flush_statements()
+
+
+_WRITE_LISTENERS: list[Callable[[str], None]] = []
+_PENDING_WRITES = threading.local()
+
+
+def add_write_listener(listener: Callable[[str], None]) -> None:
+    if listener not in _WRITE_LISTENERS:
+        _WRITE_LISTENERS.append(listener)
+
+
+def remove_write_listener(listener: Callable[[str], None]) -> None:
+    if listener in _WRITE_LISTENERS:
+        _WRITE_LISTENERS.remove(listener)
+
+
+def _record_write(table: str) -> None:
+    tables = getattr(_PENDING_WRITES, "tables", None)
+    if tables is not None:
+        tables.add(table)
+
+
+def _notify_writes(tables: set[str]) -> None:
+    for table in sorted(tables):
+        for listener in list(_WRITE_LISTENERS):
+            listener(table)
+
+
+@contextmanager
+def transaction() -> Iterator[sqlite3.Connection]:
+    pool = _get_pool()
+    if pool.holds_writer():
+        with pool.writer() as conn:
+            yield conn
+        return
+
+    with pool.writer() as conn:
+        if conn.in_transaction:
+            # Never build on a transaction an earlier failure left open.
+            conn.rollback()
+        _PENDING_WRITES.tables = set()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            _PENDING_WRITES.tables = None
+            try:
+                if conn.in_transaction:
+                    conn.rollback()
+            except sqlite3.Error:
+                pool.discard_writer()
+            raise
+        finally:
+            _flush_statements()
+        tables, _PENDING_WRITES.tables = _PENDING_WRITES.tables, None
+    _notify_writes(tables)
+
+
+def in_transaction() -> bool:
+    return _get_pool().holds_writer()
+
+
+@timed
+def check_health() -> None:
+    with _connect() as conn:
+        conn.execute("SELECT 1").fetchone()
 
 
 def _schema_meta_exists(conn: sqlite3.Connection) -> bool:
@@ -29,23 +642,74 @@ def _schema_meta_exists(conn: sqlite3.Connection) -> bool:
     return row is not None
 
 
-def _load_schema_sql() -> str:
-    schema_path = Path(__file__).with_name("schema.sql")
+class Migration(NamedTuple):
+    version: int
+    name: str
+    path: Path
+
+
+def _load_schema_sql(schema_path: Path | None = None) -> str:
+    if schema_path is None:
+        schema_path = Path(__file__).with_name("schema.sql")
     return schema_path.read_text(encoding="utf-8")
 
 
-def _apply_schema(conn: sqlite3.Connection) -> None:
+def _iter_statements(script: str) -> Iterator[str]:
+    statement = ""
+    for part in script.split(";"):
+        statement += part + ";"
+        if sqlite3.complete_statement(statement):
+            if statement.strip(" \t\r\n;"):
+                yield statement.strip()
+            statement = ""
+
+
+def _apply_schema_script(
+    conn: sqlite3.Connection,
+    schema_path: Path | None,
+    version: int,
+) -> None:
+    # executescript() commits any open transaction first, so each statement
+    # runs on its own inside the caller's BEGIN IMMEDIATE.
     applied_at = dt.datetime.utcnow().replace(microsecond=0).isoformat()
-    applied_at_literal = applied_at.replace("'", "''")
-    schema_sql = _load_schema_sql().rstrip()
-    schema_with_meta = (
-        "BEGIN;\n"
-        f"{schema_sql}\n"
-        "INSERT INTO schema_meta (version, applied_at)\n"
-        f"VALUES ({SCHEMA_VERSION}, '{applied_at_literal}');\n"
-        "COMMIT;\n"
+    for statement in _iter_statements(_load_schema_sql(schema_path)):
+        conn.execute(statement)
+    conn.execute(
+        "INSERT INTO schema_meta (version, applied_at) VALUES (?, ?)",
+        (version, applied_at),
     )
-    conn.executescript(schema_with_meta)
+
+
+def _apply_schema(conn: sqlite3.Connection) -> None:
+    _apply_schema_script(conn, None, BASE_SCHEMA_VERSION)
+
+
+def load_migrations() -> list[Migration]:
+    migrations = []
+    for path in MIGRATIONS_DIR.iterdir():
+        match = MIGRATION_FILENAME.match(path.name)
+        if match is None:
+            continue
+        migrations.append(Migration(int(match["version"]), match["name"], path))
+    migrations.sort()
+
+    expected = list(range(BASE_SCHEMA_VERSION + 1, SCHEMA_VERSION + 1))
+    if [migration.version for migration in migrations] != expected:
+        raise RuntimeError(
+            f"Migrations in {MIGRATIONS_DIR} must be numbered "
+            f"{BASE_SCHEMA_VERSION + 1} to {SCHEMA_VERSION} without gaps."
+        )
+    return migrations
+
+
+def _run_migrations(conn: sqlite3.Connection, current_version: int) -> list[int]:
+    applied = []
+    for migration in load_migrations():
+        if migration.version <= current_version:
+            continue
+        _apply_schema_script(conn, migration.path, migration.version)
+        applied.append(migration.version)
+    return applied
 
 
 def _read_schema_version(conn: sqlite3.Connection) -> int | None:
@@ -55,10 +719,21 @@ def _read_schema_version(conn: sqlite3.Connection) -> int | None:
     return row[0]
 
 
-def init_db() -> None:
-    db_path = Path(get_db_path())
-    db_path.parent.mkdir(parents=True, exist_ok=True)
+def _lookup_user_name(uid: int) -> str:
+    try:
+        return pwd.getpwuid(uid).pw_name
+    except KeyError:
+        return "unknown"
+
+
+def _lookup_group_name(gid: int) -> str:
+    try:
+        return grp.getgrgid(gid).gr_name
+    except KeyError:
+        return "unknown"
 
+
+def _log_startup_diagnostics(db_path: Path) -> None:
     print("=== DB DEBUG START ===")
     print("DB PATH:", db_path)
 
@@ -71,24 +746,8 @@ def init_db() -> None:
     try:
         st = os.stat(db_dir)
         print("DIR MODE:", oct(st.st_mode))
-        print(
-            "DIR UID:",
-            st.st_uid,
-            "(",
-            pwd.getpwuid(st.st_uid).pw_name
-            if st.st_uid in [u.pw_uid for u in pwd.getpwall()]
-            else "unknown",
-            ")",
-        )
-        print(
-            "DIR GID:",
-            st.st_gid,
-            "(",
-            grp.getgrgid(st.st_gid).gr_name
-            if st.st_gid in [g.gr_gid for g in grp.getgrall()]
-            else "unknown",
-            ")",
-        )
+        print("DIR UID:", st.st_uid, "(", _lookup_user_name(st.st_uid), ")")
+        print("DIR GID:", st.st_gid, "(", _lookup_group_name(st.st_gid), ")")
     except Exception as e:
         print("STAT ERROR:", e)
 
@@ -99,42 +758,63 @@ def init_db() -> None:
 
     print("=== DB DEBUG END ===")
 
-    with sqlite3.connect(db_path) as conn:
-        if not _schema_meta_exists(conn):
-            _apply_schema(conn)
-            return
 
-        version = _read_schema_version(conn)
-        if version is None:
-            raise RuntimeError("Corrupt database: schema_meta table is empty.")
-        if version != SCHEMA_VERSION:
-            raise RuntimeError(
-                f"Unsupported schema version: {version}. Expected {SCHEMA_VERSION}."
-            )
+def init_db() -> None:
+    db_path = Path(get_db_path())
+    db_path.parent.mkdir(parents=True, exist_ok=True)
 
+    if get_settings().startup_diagnostics:
+        _log_startup_diagnostics(db_path)
 
-def get_daily_log(date_value: str) -> dict[str, object] | None:
-    with _connect() as conn:
-        row = conn.execute(
-            """
-            SELECT
-                date,
-                walked,
-                no_alcohol_after_21,
-                food_respected,
-                note,
-                special_occasion,
-                created_at,
-                updated_at
-            FROM daily_log
-            WHERE date = ?
-            """,
-            (date_value,),
-        ).fetchone()
+    _initialize_pool(_get_pool())
 
-    if row is None:
+
+def _current_schema_version(conn: sqlite3.Connection) -> int | None:
+    if not _schema_meta_exists(conn):
         return None
+    version = _read_schema_version(conn)
+    if version is None:
+        raise RuntimeError("Corrupt database: schema_meta table is empty.")
+    if version > SCHEMA_VERSION:
+        raise RuntimeError(
+            f"Unsupported schema version: {version}. Expected {SCHEMA_VERSION}."
+        )
+    return version
+
+
+def _initialize_pool(pool: ConnectionPool) -> None:
+    with pool.writer() as conn:
+        if _current_schema_version(conn) == SCHEMA_VERSION:
+            return
+        # Other workers or containers may be setting up the same file; decide
+        # what is missing only once the write lock is held.
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            version = _current_schema_version(conn)
+            if version is None:
+                _apply_schema(conn)
+                version = BASE_SCHEMA_VERSION
+            _run_migrations(conn, version)
+            conn.commit()
+        except BaseException:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+
+
+_DAILY_LOG_COLUMNS = """
+    date,
+    walked,
+    no_alcohol_after_21,
+    food_respected,
+    note,
+    special_occasion,
+    created_at,
+    updated_at
+"""
 
+
+def _row_to_daily_log(row: sqlite3.Row) -> dict[str, object]:
     return {
         "date": row["date"],
         "walked": bool(row["walked"]),
@@ -147,35 +827,191 @@ def get_daily_log(date_value: str) -> dict[str, object] | None:
     }
 
 
+@timed
+def get_daily_log(date_value: str) -> dict[str, object] | None:
+    with _connect() as conn:
+        row = conn.execute(
+            f"SELECT {_DAILY_LOG_COLUMNS} FROM daily_log WHERE date = ?",
+            (date_value,),
+        ).fetchone()
+
+    if row is None:
+        return None
+
+    return _row_to_daily_log(row)
+
+
+@timed
+def get_daily_logs_range(
+    start_date: str,
+    end_date: str,
+) -> dict[str, dict[str, object] | None]:
+    start = dt.date.fromisoformat(start_date)
+    end = dt.date.fromisoformat(end_date)
+    if end < start:
+        raise ValueError("end_date must not be before start_date.")
+
+    with _connect() as conn:
+        rows = conn.execute(
+            f"""
+            SELECT {_DAILY_LOG_COLUMNS}
+            FROM daily_log
+            WHERE date >= ? AND date <= ?
+            ORDER BY date
+            """,
+            (start_date, end_date),
+        ).fetchall()
+
+    found = {row["date"]: _row_to_daily_log(row) for row in rows}
+    logs: dict[str, dict[str, object] | None] = {}
+    for offset in range((end - start).days + 1):
+        day_value = (start + dt.timedelta(days=offset)).isoformat()
+        logs[day_value] = found.get(day_value)
+    return logs
+
+
+@timed
+def get_daily_log_validator_rows(
+    start_date: str,
+    end_date: str,
+    year: int,
+    week: int,
+) -> tuple[list[tuple[object, ...]], tuple[object, ...] | None]:
+    with _connect() as conn:
+        days = conn.execute(
+            """
+            SELECT date, habit_mask, note, created_at, updated_at
+            FROM daily_log
+            WHERE date >= ? AND date <= ?
+            ORDER BY date
+            """,
+            (start_date, end_date),
+        ).fetchall()
+        weight = conn.execute(
+            """
+            SELECT weight_kg, created_at
+            FROM weekly_weight
+            WHERE year = ? AND week = ?
+            """,
+            (year, week),
+        ).fetchone()
+    return [tuple(row) for row in days], tuple(weight) if weight else None
+
+
+@timed
 def count_orange_days(
     *,
     start_date: str,
     end_date: str,
     exclude_date: str | None = None,
 ) -> int:
-    query = """
-        SELECT COUNT(*)
-        FROM daily_log
+    return count_orange_days_by_window(
+        [(start_date, end_date)],
+        exclude_date=exclude_date,
+    )[0]
+
+
+@timed
+def count_orange_days_by_window(
+    windows: Sequence[tuple[str, str]],
+    *,
+    exclude_date: str | None = None,
+) -> list[int]:
+    if not windows:
+        return []
+
+    columns = ",\n".join(
+        "COALESCE(SUM(date >= ? AND date <= ?), 0)" for _ in windows
+    )
+    query = f"""
+        SELECT {columns}
+        FROM orange_day
         WHERE date >= ? AND date <= ?
-          AND special_occasion = 1
-          AND (
-            walked = 0
-            OR no_alcohol_after_21 = 0
-            OR food_respected = 0
-          )
     """
-    params: list[object] = [start_date, end_date]
+    params: list[object] = []
+    for start_date, end_date in windows:
+        params.extend((start_date, end_date))
+    params.append(min(start_date for start_date, _ in windows))
+    params.append(max(end_date for _, end_date in windows))
     if exclude_date:
         query += " AND date != ?"
         params.append(exclude_date)
 
     with _connect() as conn:
         row = conn.execute(query, params).fetchone()
-    if row is None:
-        return 0
-    return int(row[0])
+    return [int(value) for value in row]
+
+
+_UPSERT_DAILY_LOG_SQL = """
+    INSERT INTO daily_log (
+        date,
+        walked,
+        no_alcohol_after_21,
+        food_respected,
+        note,
+        special_occasion,
+        created_at,
+        updated_at
+    )
+    VALUES (
+        :date,
+        :walked,
+        :no_alcohol_after_21,
+        :food_respected,
+        :note,
+        :special_occasion,
+        :created_at,
+        :updated_at
+    )
+    ON CONFLICT (date) DO UPDATE SET
+        walked = excluded.walked,
+        no_alcohol_after_21 = excluded.no_alcohol_after_21,
+        food_respected = excluded.food_respected,
+        note = excluded.note,
+        special_occasion = excluded.special_occasion,
+        updated_at = excluded.updated_at
+    WHERE (
+        walked,
+        no_alcohol_after_21,
+        food_respected,
+        note,
+        special_occasion
+    ) IS NOT (
+        excluded.walked,
+        excluded.no_alcohol_after_21,
+        excluded.food_respected,
+        excluded.note,
+        excluded.special_occasion
+    )
+"""
+UPSERT_BATCH_SIZE = 500
+
+
+def _utc_now() -> str:
+    return dt.datetime.utcnow().replace(microsecond=0).isoformat()
+
+
+def _executemany_batched(
+    conn: sqlite3.Connection,
+    query: str,
+    rows: Iterable[Mapping[str, object]],
+    batch_size: int,
+) -> int:
+    changed = 0
+    iterator = iter(rows)
+    while batch := list(islice(iterator, batch_size)):
+        changed += conn.executemany(query, batch).rowcount
+    return changed
+
 
+def _stamp_rows(
+    rows: Iterable[Mapping[str, object]], now: str
+) -> Iterator[dict[str, object]]:
+    for row in rows:
+        yield {"created_at": now, **row, "updated_at": now}
 
+
+@timed
 def upsert_daily_log(
     *,
     date_value: str,
@@ -185,65 +1021,195 @@ def upsert_daily_log(
     note: str | None,
     special_occasion: bool,
 ) -> None:
-    now = dt.datetime.utcnow().replace(microsecond=0).isoformat()
+    with transaction() as conn:
+        now = _utc_now()
+        cursor = conn.execute(
+            _UPSERT_DAILY_LOG_SQL,
+            {
+                "date": date_value,
+                "walked": int(walked),
+                "no_alcohol_after_21": int(no_alcohol_after_21),
+                "food_respected": int(food_respected),
+                "note": note,
+                "special_occasion": int(special_occasion),
+                "created_at": now,
+                "updated_at": now,
+            },
+        )
+        if cursor.rowcount:
+            _record_write("daily_log")
+
 
+@timed
+def upsert_daily_logs(
+    rows: Iterable[Mapping[str, object]],
+    *,
+    batch_size: int = UPSERT_BATCH_SIZE,
+) -> int:
+    with transaction() as conn:
+        changed = _executemany_batched(
+            conn, _UPSERT_DAILY_LOG_SQL, _stamp_rows(rows, _utc_now()), batch_size
+        )
+        if changed:
+            _record_write("daily_log")
+        return changed
+
+
+@timed
+def get_orange_days(start_date: str, end_date: str) -> list[dt.date]:
     with _connect() as conn:
-        existing = conn.execute(
-            "SELECT created_at FROM daily_log WHERE date = ?",
-            (date_value,),
+        rows = conn.execute(
+            """
+            SELECT date
+            FROM orange_day
+            WHERE date >= ? AND date <= ?
+            ORDER BY date
+            """,
+            (start_date, end_date),
+        ).fetchall()
+    return [dt.date.fromisoformat(row["date"]) for row in rows]
+
+
+EXPORT_BATCH_SIZE = 500
+_EXPORT_QUERIES = {
+    "daily_log": (
+        f"SELECT {_DAILY_LOG_COLUMNS} FROM daily_log",
+        "updated_at",
+        ("date",),
+    ),
+    "weekly_weight": (
+        "SELECT year, week, weight_kg, created_at, updated_at FROM weekly_weight",
+        "updated_at",
+        ("year", "week"),
+    ),
+}
+
+
+def _row_to_weekly_weight(row: sqlite3.Row) -> dict[str, object]:
+    return {
+        "year": row["year"],
+        "week": row["week"],
+        "weight_kg": row["weight_kg"],
+        "created_at": row["created_at"],
+        "updated_at": row["updated_at"],
+    }
+
+
+def iter_table_rows(
+    table: str,
+    *,
+    since: str | None = None,
+    batch_size: int = EXPORT_BATCH_SIZE,
+) -> Iterator[list[dict[str, object]]]:
+    if table not in _EXPORT_QUERIES:
+        raise ValueError(f"Unknown table: {table}")
+    query, since_column, key_columns = _EXPORT_QUERIES[table]
+    key = ", ".join(key_columns)
+    placeholders = ", ".join("?" for _ in key_columns)
+    convert = _row_to_daily_log if table == "daily_log" else _row_to_weekly_weight
+
+    # Each page is read in its own short statement; holding one read
+    # transaction across yields would block writers in rollback mode for as
+    # long as the client takes to download the export.
+    last_key: tuple[object, ...] | None = None
+    while True:
+        conditions = []
+        params: list[object] = []
+        if since:
+            conditions.append(f"{since_column} >= ?")
+            params.append(since)
+        if last_key is not None:
+            conditions.append(f"({key}) > ({placeholders})")
+            params.extend(last_key)
+        page_query = query
+        if conditions:
+            page_query += " WHERE " + " AND ".join(conditions)
+        page_query += f" ORDER BY {key} LIMIT ?"
+        params.append(batch_size)
+        with _connect() as conn:
+            rows = conn.execute(page_query, params).fetchall()
+        if not rows:
+            return
+        last_key = tuple(rows[-1][column] for column in key_columns)
+        yield [convert(row) for row in rows]
+        if len(rows) < batch_size:
+            return
+
+
+@timed
+def get_sync_changes(
+    day_cursor: tuple[str, str],
+    weight_cursor: tuple[str, int, int],
+    *,
+    until: str,
+    limit: int,
+) -> tuple[list[dict[str, object]], list[dict[str, object]], bool]:
+    with _get_pool().snapshot() as conn:
+        days = conn.execute(
+            f"""
+            SELECT {_DAILY_LOG_COLUMNS}
+            FROM daily_log
+            WHERE (updated_at, date) > (?, ?) AND updated_at < ?
+            ORDER BY updated_at, date
+            LIMIT ?
+            """,
+            (*day_cursor, until, limit + 1),
+        ).fetchall()
+        if len(days) > limit:
+            return [_row_to_daily_log(row) for row in days[:limit]], [], True
+        weights = conn.execute(
+            """
+            SELECT year, week, weight_kg, created_at, updated_at
+            FROM weekly_weight
+            WHERE (updated_at, year, week) > (?, ?, ?) AND updated_at < ?
+            ORDER BY updated_at, year, week
+            LIMIT ?
+            """,
+            (*weight_cursor, until, limit - len(days) + 1),
+        ).fetchall()
+    has_more = len(weights) > limit - len(days)
+    return (
+        [_row_to_daily_log(row) for row in days],
+        [_row_to_weekly_weight(row) for row in weights[: limit - len(days)]],
+        has_more,
+    )
+
+
+@timed
+def get_habit_masks() -> list[tuple[int, int]]:
+    with _connect() as conn:
+        rows = conn.execute(
+            """
+            SELECT
+                CAST(julianday(date) - 1721424.5 AS INTEGER),
+                habit_mask
+            FROM daily_log
+            ORDER BY date
+            """
+        ).fetchall()
+    return [(row[0], row[1]) for row in rows]
+
+
+@timed
+def get_revision(table: str) -> int:
+    with _connect() as conn:
+        row = conn.execute(
+            "SELECT revision FROM change_counter WHERE name = ?",
+            (table,),
         ).fetchone()
+    if row is None:
+        raise ValueError(f"Unknown change counter: {table}")
+    return int(row[0])
 
-        if existing is None:
-            conn.execute(
-                """
-                INSERT INTO daily_log (
-                    date,
-                    walked,
-                    no_alcohol_after_21,
-                    food_respected,
-                    note,
-                    special_occasion,
-                    created_at,
-                    updated_at
-                )
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                """,
-                (
-                    date_value,
-                    int(walked),
-                    int(no_alcohol_after_21),
-                    int(food_respected),
-                    note,
-                    int(special_occasion),
-                    now,
-                    now,
-                ),
-            )
-        else:
-            conn.execute(
-                """
-                UPDATE daily_log
-                SET
-                    walked = ?,
-                    no_alcohol_after_21 = ?,
-                    food_respected = ?,
-                    note = ?,
-                    special_occasion = ?,
-                    updated_at = ?
-                WHERE date = ?
-                """,
-                (
-                    int(walked),
-                    int(no_alcohol_after_21),
-                    int(food_respected),
-                    note,
-                    int(special_occasion),
-                    now,
-                    date_value,
-                ),
-            )
 
+@timed
+def get_revisions() -> dict[str, int]:
+    with _connect() as conn:
+        rows = conn.execute("SELECT name, revision FROM change_counter").fetchall()
+    return {row["name"]: int(row["revision"]) for row in rows}
 
+
+@timed
 def get_weekly_weight(year: int, week: int) -> dict[str, object] | None:
     with _connect() as conn:
         row = conn.execute(
@@ -252,7 +1218,8 @@ def get_weekly_weight(year: int, week: int) -> dict[str, object] | None:
                 year,
                 week,
                 weight_kg,
-                created_at
+                created_at,
+                updated_at
             FROM weekly_weight
             WHERE year = ? AND week = ?
             """,
@@ -262,37 +1229,78 @@ def get_weekly_weight(year: int, week: int) -> dict[str, object] | None:
     if row is None:
         return None
 
-    return {
-        "year": row["year"],
-        "week": row["week"],
-        "weight_kg": row["weight_kg"],
-        "created_at": row["created_at"],
-    }
+    return _row_to_weekly_weight(row)
 
 
-def upsert_weekly_weight(*, year: int, week: int, weight_kg: float) -> None:
-    now = dt.datetime.utcnow().replace(microsecond=0).isoformat()
+@timed
+def get_weekly_weights() -> list[tuple[int, int, float]]:
+    with _connect() as conn:
+        rows = conn.execute(
+            """
+            SELECT year, week, weight_kg
+            FROM weekly_weight
+            ORDER BY year, week
+            """
+        ).fetchall()
+    return [(row[0], row[1], row[2]) for row in rows]
+
 
+@timed
+def get_weekly_weights_range(
+    start: tuple[int, int],
+    end: tuple[int, int],
+) -> list[dict[str, object]]:
     with _connect() as conn:
-        existing = conn.execute(
-            "SELECT created_at FROM weekly_weight WHERE year = ? AND week = ?",
-            (year, week),
-        ).fetchone()
+        rows = conn.execute(
+            """
+            SELECT year, week, weight_kg, created_at, updated_at
+            FROM weekly_weight
+            WHERE (year, week) >= (?, ?) AND (year, week) <= (?, ?)
+            ORDER BY year, week
+            """,
+            (*start, *end),
+        ).fetchall()
+    return [_row_to_weekly_weight(row) for row in rows]
 
-        if existing is None:
-            conn.execute(
-                """
-                INSERT INTO weekly_weight (year, week, weight_kg, created_at)
-                VALUES (?, ?, ?, ?)
-                """,
-                (year, week, weight_kg, now),
-            )
-        else:
-            conn.execute(
-                """
-                UPDATE weekly_weight
-                SET weight_kg = ?
-                WHERE year = ? AND week = ?
-                """,
-                (weight_kg, year, week),
-            )
+
+_UPSERT_WEEKLY_WEIGHT_SQL = """
+    INSERT INTO weekly_weight (year, week, weight_kg, created_at, updated_at)
+    VALUES (:year, :week, :weight_kg, :created_at, :updated_at)
+    ON CONFLICT (year, week) DO UPDATE SET
+        weight_kg = excluded.weight_kg,
+        updated_at = excluded.updated_at
+    WHERE weight_kg != excluded.weight_kg
+"""
+
+
+@timed
+def upsert_weekly_weight(*, year: int, week: int, weight_kg: float) -> None:
+    with transaction() as conn:
+        now = _utc_now()
+        cursor = conn.execute(
+            _UPSERT_WEEKLY_WEIGHT_SQL,
+            {
+                "year": year,
+                "week": week,
+                "weight_kg": weight_kg,
+                "created_at": now,
+                "updated_at": now,
+            },
+        )
+        if cursor.rowcount:
+            _record_write("weekly_weight")
+
+
+@timed
+def upsert_weekly_weights(
+    rows: Iterable[Mapping[str, object]],
+    *,
+    batch_size: int = UPSERT_BATCH_SIZE,
+) -> int:
+    with transaction() as conn:
+        changed = _executemany_batched(
+            conn, _UPSERT_WEEKLY_WEIGHT_SQL, _stamp_rows(rows, _utc_now()), batch_size
+        )
+        if changed:
+            _record_write("weekly_weight")
+        return changed
@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import csv
+import datetime as dt
+import io
+import json
+from typing import Iterable, Iterator
+
+EXPORT_TABLES = ("daily_log", "weekly_weight")
+EXPORT_FORMATS = ("csv", "ndjson")
+EXPORT_FIELDS = {
+    "daily_log": (
+        "date",
+        "walked",
+        "no_alcohol_after_21",
+        "food_respected",
+        "note",
+        "special_occasion",
+        "created_at",
+        "updated_at",
+    ),
+    "weekly_weight": ("year", "week", "weight_kg", "created_at", "updated_at"),
+}
+
+
+class ExportError(ValueError):
+    pass
+
+
+def parse_since(value: str | None) -> str | None:
+    if not value:
+        return None
+    try:
+        since = dt.datetime.fromisoformat(value.strip())
+    except ValueError as exc:
+        raise ExportError("since must be an ISO date or datetime.") from exc
+    if since.tzinfo is not None:
+        since = since.astimezone(dt.timezone.utc).replace(tzinfo=None)
+    return since.replace(microsecond=0).isoformat()
+
+
+def parse_tables(value: str | None, *, default: Iterable[str]) -> tuple[str, ...]:
+    if not value:
+        return tuple(default)
+    tables = tuple(name.strip() for name in value.split(",") if name.strip())
+    unknown = [name for name in tables if name not in EXPORT_TABLES]
+    if unknown or not tables:
+        raise ExportError("table must be one of: " + ", ".join(EXPORT_TABLES) + ".")
+    return tables
+
+
+def _csv_value(value: object) -> object:
+    if isinstance(value, bool):
+        return int(value)
+    return value
+
+
+def iter_csv(table: str, since: str | None = None) -> Iterator[str]:
+    # db is imported lazily so the CLI can read the export constants without
+    # loading flask and the connection pool before --profile-startup starts.
+    from .db import iter_table_rows
+
+    fields = EXPORT_FIELDS[table]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(fields)
+    yield buffer.getvalue()
+
+    for batch in iter_table_rows(table, since=since):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(
+            [_csv_value(row[field]) for field in fields] for row in batch
+        )
+        yield buffer.getvalue()
+
+
+def iter_ndjson(tables: Iterable[str], since: str | None = None) -> Iterator[str]:
+    from .db import iter_table_rows
+
+    for table in tables:
+        for batch in iter_table_rows(table, since=since):
+            yield "".join(
+                json.dumps({"table": table, **row}, separators=(",", ":")) + "\n"
+                for row in batch
+            )
+
+
+def iter_export(
+    export_format: str,
+    tables: tuple[str, ...],
+    since: str | None = None,
+) -> Iterator[str]:
+    if export_format == "csv":
+        if len(tables) != 1:
+            raise ExportError("CSV exports contain exactly one table.")
+        return iter_csv(tables[0], since)
+    if export_format == "ndjson":
+        return iter_ndjson(tables, since)
+    raise ExportError("format must be one of: " + ", ".join(EXPORT_FORMATS) + ".")
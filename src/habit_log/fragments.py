@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from typing import Callable, Hashable
+
+from .db import add_write_listener, get_shard_key, in_transaction
+
+DEFAULT_FRAGMENT_CACHE_SIZE = 512
+
+
+class FragmentCache:
+    def __init__(self, maxsize: int = DEFAULT_FRAGMENT_CACHE_SIZE) -> None:
+        self.maxsize = maxsize
+        self._entries: OrderedDict[
+            tuple[str, str, Hashable], tuple[int, str]
+        ] = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+    def get_or_render(
+        self,
+        table: str,
+        key: Hashable,
+        revision: int,
+        render: Callable[[], str],
+    ) -> str:
+        cache_key = (get_shard_key(), table, key)
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is not None and entry[0] == revision:
+                self._entries.move_to_end(cache_key)
+                self._stats["hits"] += 1
+                return entry[1]
+            self._stats["misses"] += 1
+
+        html = render()
+        if in_transaction():
+            return html
+        with self._lock:
+            self._entries[cache_key] = (revision, html)
+            self._entries.move_to_end(cache_key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+        return html
+
+    def invalidate(self, table: str | None = None) -> None:
+        shard = get_shard_key() if table is not None else None
+        with self._lock:
+            if table is None:
+                removed = len(self._entries)
+                self._entries.clear()
+            else:
+                stale = [
+                    key for key in self._entries if key[0] == shard and key[1] == table
+                ]
+                for key in stale:
+                    del self._entries[key]
+                removed = len(stale)
+            self._stats["invalidations"] += removed
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {**self._stats, "size": len(self._entries), "maxsize": self.maxsize}
+
+
+_FRAGMENTS = FragmentCache()
+add_write_listener(_FRAGMENTS.invalidate)
+
+
+def get_fragment_cache() -> FragmentCache:
+    return _FRAGMENTS
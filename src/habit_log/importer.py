@@ -0,0 +1,316 @@
+from __future__ import annotations
+
+import csv
+import datetime as dt
+import json
+import time
+from decimal import Decimal, InvalidOperation
+from typing import Iterable, Iterator, Mapping, TextIO
+
+from .db import (
+    UPSERT_BATCH_SIZE,
+    get_orange_days,
+    transaction,
+    upsert_daily_logs,
+    upsert_weekly_weights,
+)
+from .export import EXPORT_FORMATS, EXPORT_TABLES
+from .rules import (
+    OrangeQuotaTracker,
+    WEIGHT_RANGE_ERROR,
+    compute_day_status,
+    get_iso_week_bounds,
+    get_orange_window_start,
+    is_weight_in_range,
+    normalize_weight,
+)
+
+IMPORT_FORMATS = EXPORT_FORMATS
+IMPORT_BATCH_SIZE = UPSERT_BATCH_SIZE
+MAX_REPORTED_REJECTIONS = 100
+TRUE_VALUES = {"1", "true", "yes", "on", "y", "x"}
+FALSE_VALUES = {"", "0", "false", "no", "off", "n"}
+DAILY_LOG_FLAGS = (
+    "walked",
+    "no_alcohol_after_21",
+    "food_respected",
+    "special_occasion",
+)
+
+
+class ImportFormatError(ValueError):
+    pass
+
+
+class RowError(ValueError):
+    pass
+
+
+def infer_format(filename: str | None, default: str = "ndjson") -> str:
+    if filename:
+        suffix = filename.rsplit(".", 1)[-1].lower()
+        if suffix in IMPORT_FORMATS:
+            return suffix
+        if suffix in {"jsonl", "json"}:
+            return "ndjson"
+    return default
+
+
+def _iter_csv_records(
+    stream: TextIO, table: str
+) -> Iterator[tuple[int, str, dict[str, object]]]:
+    reader = csv.DictReader(stream)
+    if reader.fieldnames is None:
+        return
+    for record in reader:
+        yield reader.line_num, table, record
+
+
+def _iter_ndjson_records(
+    stream: TextIO, table: str
+) -> Iterator[tuple[int, str, dict[str, object] | None]]:
+    for line_number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            yield line_number, table, None
+            continue
+        if not isinstance(record, dict):
+            yield line_number, table, None
+            continue
+        yield line_number, str(record.get("table") or table), record
+
+
+def iter_records(
+    stream: TextIO, import_format: str, table: str
+) -> Iterator[tuple[int, str, dict[str, object] | None]]:
+    if table not in EXPORT_TABLES:
+        raise ImportFormatError(
+            "table must be one of: " + ", ".join(EXPORT_TABLES) + "."
+        )
+    if import_format == "csv":
+        return _iter_csv_records(stream, table)
+    if import_format == "ndjson":
+        return _iter_ndjson_records(stream, table)
+    raise ImportFormatError(
+        "format must be one of: " + ", ".join(IMPORT_FORMATS) + "."
+    )
+
+
+def _parse_flag(record: dict[str, object], name: str) -> bool:
+    value = record.get(name)
+    if isinstance(value, bool):
+        return value
+    text = "" if value is None else str(value).strip().lower()
+    if text in TRUE_VALUES:
+        return True
+    if text in FALSE_VALUES:
+        return False
+    raise RowError(f"{name} must be a boolean.")
+
+
+def _parse_created_at(record: dict[str, object], row: dict[str, object]) -> None:
+    value = record.get("created_at")
+    if not value:
+        return
+    try:
+        parsed = dt.datetime.fromisoformat(str(value).strip())
+    except ValueError as exc:
+        raise RowError("created_at must be an ISO datetime.") from exc
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(dt.timezone.utc).replace(tzinfo=None)
+    row["created_at"] = parsed.replace(microsecond=0).isoformat()
+
+
+def _parse_int(record: dict[str, object], name: str) -> int:
+    value = record.get(name)
+    if isinstance(value, bool):
+        raise RowError(f"{name} must be an integer.")
+    try:
+        return int(str(value).strip())
+    except ValueError as exc:
+        raise RowError(f"{name} must be an integer.") from exc
+
+
+def parse_daily_log_record(record: dict[str, object]) -> dict[str, object]:
+    try:
+        day = dt.date.fromisoformat(str(record.get("date") or "").strip())
+    except ValueError as exc:
+        raise RowError("date must be an ISO date.") from exc
+    row: dict[str, object] = {"date": day.isoformat()}
+    for name in DAILY_LOG_FLAGS:
+        row[name] = int(_parse_flag(record, name))
+    note = record.get("note")
+    row["note"] = str(note).strip() or None if note is not None else None
+    _parse_created_at(record, row)
+    return row
+
+
+def parse_weekly_weight_record(record: dict[str, object]) -> dict[str, object]:
+    year = _parse_int(record, "year")
+    week = _parse_int(record, "week")
+    try:
+        dt.date.fromisocalendar(year, week, 1)
+    except ValueError as exc:
+        raise RowError("year and week must form a valid ISO week.") from exc
+    try:
+        weight = normalize_weight(
+            Decimal(str(record.get("weight_kg")).strip().replace(",", "."))
+        )
+    except InvalidOperation as exc:
+        raise RowError(WEIGHT_RANGE_ERROR) from exc
+    if not weight.is_finite() or not is_weight_in_range(weight):
+        raise RowError(WEIGHT_RANGE_ERROR)
+    row: dict[str, object] = {"year": year, "week": week, "weight_kg": float(weight)}
+    _parse_created_at(record, row)
+    return row
+
+
+def is_orange_record(row: dict[str, object]) -> bool:
+    return (
+        compute_day_status(
+            walked=bool(row["walked"]),
+            food_respected=bool(row["food_respected"]),
+            no_alcohol_after_21=bool(row["no_alcohol_after_21"]),
+            special_occasion=bool(row["special_occasion"]),
+        )
+        == "orange"
+    )
+
+
+def check_orange_quotas(days: Mapping[str, dict[str, object]]) -> dict[str, str]:
+    if not days:
+        return {}
+    first_day = dt.date.fromisoformat(min(days))
+    last_day = dt.date.fromisoformat(max(days))
+    start = min(get_orange_window_start(first_day), get_iso_week_bounds(first_day)[0])
+    end = get_iso_week_bounds(last_day)[1]
+    stored = {
+        day.isoformat(): day
+        for day in get_orange_days(start.isoformat(), end.isoformat())
+    }
+    tracker = OrangeQuotaTracker(
+        day for date_value, day in stored.items() if date_value not in days
+    )
+    violations = {}
+    for date_value in sorted(days):
+        if is_orange_record(days[date_value]):
+            error = tracker.add(dt.date.fromisoformat(date_value))
+            if error is not None:
+                violations[date_value] = error
+                if date_value in stored:
+                    # The stored orange day stays when its replacement is
+                    # rejected, so it still counts against later rows.
+                    tracker.record(stored[date_value])
+    return violations
+
+
+class _Report:
+    def __init__(self) -> None:
+        self.rows_read = 0
+        self.rejected = 0
+        self.rejections: list[dict[str, object]] = []
+
+    def reject(self, line: int | None, table: str, error: str) -> None:
+        self.rejected += 1
+        if len(self.rejections) < MAX_REPORTED_REJECTIONS:
+            self.rejections.append({"line": line, "table": table, "error": error})
+
+
+class _Batch:
+    def __init__(self) -> None:
+        self.days: dict[str, dict[str, object]] = {}
+        self.day_lines: dict[str, int] = {}
+        self.weights: dict[tuple[int, int], dict[str, object]] = {}
+
+    def __len__(self) -> int:
+        return len(self.days) + len(self.weights)
+
+
+def _iter_batches(
+    records: Iterable[tuple[int, str, dict[str, object] | None]],
+    report: _Report,
+    import_format: str,
+    batch_size: int,
+) -> Iterator[_Batch]:
+    batch = _Batch()
+    try:
+        for line, record_table, record in records:
+            report.rows_read += 1
+            if record is None:
+                report.reject(line, record_table, "Line is not a JSON object.")
+                continue
+            try:
+                if record_table == "daily_log":
+                    row = parse_daily_log_record(record)
+                    batch.days[row["date"]] = row
+                    batch.day_lines[row["date"]] = line
+                elif record_table == "weekly_weight":
+                    row = parse_weekly_weight_record(record)
+                    batch.weights[(row["year"], row["week"])] = row
+                else:
+                    raise RowError(f"Unknown table {record_table!r}.")
+            except RowError as exc:
+                report.reject(line, record_table, str(exc))
+                continue
+            if len(batch) >= batch_size:
+                yield batch
+                batch = _Batch()
+    except (csv.Error, UnicodeDecodeError) as exc:
+        raise ImportFormatError(f"Could not parse {import_format}: {exc}") from exc
+    if len(batch):
+        yield batch
+
+
+def import_records(
+    stream: TextIO,
+    import_format: str,
+    *,
+    table: str = "daily_log",
+    batch_size: int = IMPORT_BATCH_SIZE,
+) -> dict[str, object]:
+    started = time.perf_counter()
+    records = iter_records(stream, import_format, table)
+    report = _Report()
+    imported_days: set[str] = set()
+    imported_weeks: set[tuple[int, int]] = set()
+    changed = 0
+
+    # Rows are parsed and written batch by batch, so memory stays bounded by
+    # batch_size; the quota check of each batch sees the batches before it.
+    with transaction():
+        for batch in _iter_batches(records, report, import_format, batch_size):
+            violations = check_orange_quotas(batch.days)
+            for date_value, error in violations.items():
+                report.reject(batch.day_lines[date_value], "daily_log", error)
+            accepted_days = [
+                batch.days[date_value]
+                for date_value in sorted(batch.days)
+                if date_value not in violations
+            ]
+            changed += upsert_daily_logs(accepted_days)
+            changed += upsert_weekly_weights(
+                batch.weights[key] for key in sorted(batch.weights)
+            )
+            imported_days.update(row["date"] for row in accepted_days)
+            imported_weeks.update(batch.weights)
+    imported = {"daily_log": len(imported_days), "weekly_weight": len(imported_weeks)}
+
+    elapsed = time.perf_counter() - started
+    report.rejections.sort(key=lambda entry: entry["line"] or 0)
+    return {
+        "format": import_format,
+        "rows_read": report.rows_read,
+        "imported": imported,
+        "changed": changed,
+        "duplicates": report.rows_read
+        - report.rejected
+        - imported["daily_log"]
+        - imported["weekly_weight"],
+        "rejected": report.rejected,
+        "rejections": report.rejections,
+        "elapsed_seconds": round(elapsed, 4),
+        "rows_per_second": round(report.rows_read / elapsed, 1) if elapsed else None,
+    }
@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+from functools import lru_cache
+from typing import TYPE_CHECKING, NamedTuple
+
+if TYPE_CHECKING:
+    from babel.core import Locale
+    from babel.numbers import NumberPattern
+
+DEFAULT_LOCALE = "en_US"
+LOCALE_CACHE_SIZE = 256
+WEIGHT_FORMAT = "0.0"
+
+
+class ResolvedLocale(NamedTuple):
+    name: str
+    locale: Locale
+    decimal_symbol: str
+    weight_pattern: NumberPattern
+
+
+def _normalize_locale(raw_locale: str | None) -> str:
+    from babel.core import Locale, UnknownLocaleError
+
+    if not raw_locale:
+        return DEFAULT_LOCALE
+    value = raw_locale.replace("-", "_")
+    try:
+        Locale.parse(value)
+    except (ValueError, UnknownLocaleError):
+        base = value.split("_", 1)[0]
+        try:
+            Locale.parse(base)
+        except (ValueError, UnknownLocaleError):
+            return DEFAULT_LOCALE
+        return base
+    return value
+
+
+@lru_cache(maxsize=LOCALE_CACHE_SIZE)
+def resolve_locale(raw_locale: str | None) -> ResolvedLocale:
+    from babel.core import Locale
+    from babel.numbers import get_decimal_symbol, parse_pattern
+
+    name = _normalize_locale(raw_locale)
+    locale = Locale.parse(name)
+    return ResolvedLocale(
+        name=name,
+        locale=locale,
+        decimal_symbol=get_decimal_symbol(locale),
+        weight_pattern=parse_pattern(WEIGHT_FORMAT),
+    )
+
+
+def format_weight(
+    value: float,
+    resolved: ResolvedLocale,
+    decimal_symbol: str,
+) -> str:
+    formatted = resolved.weight_pattern.apply(value, resolved.locale)
+    if decimal_symbol and decimal_symbol != resolved.decimal_symbol:
+        return formatted.replace(resolved.decimal_symbol, decimal_symbol)
+    return formatted
+
+
+def get_locale_cache_stats() -> dict[str, int]:
+    info = resolve_locale.cache_info()
+    return {
+        "hits": info.hits,
+        "misses": info.misses,
+        "size": info.currsize,
+        "max_size": info.maxsize,
+    }
+
+
+def clear_locale_cache() -> None:
+    resolve_locale.cache_clear()
@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+import math
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Iterator, TypeVar
+
+from .config import get_login_throttle_db_path
+from .db import ConnectionPool, get_named_pool
+
+T = TypeVar("T")
+
+LOGIN_TIMEOUT_SECONDS = 30.0
+THROTTLE_POOL = "login_throttle"
+THROTTLE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS login_attempt (
+    id                  INTEGER     PRIMARY KEY,
+    client              TEXT        NOT NULL,
+    attempted_at        REAL        NOT NULL
+);
+CREATE INDEX IF NOT EXISTS login_attempt_client_idx
+ON login_attempt (client, attempted_at);
+CREATE INDEX IF NOT EXISTS login_attempt_attempted_at_idx
+ON login_attempt (attempted_at);
+"""
+
+
+class LoginBusyError(RuntimeError):
+    pass
+
+
+class LoginThrottledError(RuntimeError):
+    def __init__(self, retry_after: int) -> None:
+        super().__init__(f"Too many failed attempts; retry in {retry_after}s.")
+        self.retry_after = retry_after
+
+
+class FailedLoginThrottle:
+    # Attempts live in a small SQLite file shared by every gunicorn worker.
+    # Each one is recorded before the hash is checked, under BEGIN IMMEDIATE,
+    # so parallel requests cannot all pass the check before any is counted.
+    def __init__(self, max_failures: int, window_seconds: float) -> None:
+        self.max_failures = max_failures
+        self.window_seconds = window_seconds
+
+    def _pool(self) -> ConnectionPool:
+        return get_named_pool(THROTTLE_POOL, get_login_throttle_db_path())
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        with self._pool().writer() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+                conn.commit()
+            except BaseException:
+                if conn.in_transaction:
+                    conn.rollback()
+                raise
+
+    def init(self) -> None:
+        Path(get_login_throttle_db_path()).parent.mkdir(parents=True, exist_ok=True)
+        with self._pool().writer() as conn:
+            conn.executescript(THROTTLE_SCHEMA)
+
+    def begin(self, client: str) -> int:
+        now = time.time()
+        cutoff = now - self.window_seconds
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM login_attempt WHERE attempted_at <= ?", (cutoff,))
+            recent = [
+                row[0]
+                for row in conn.execute(
+                    """
+                    SELECT attempted_at
+                    FROM login_attempt
+                    WHERE client = ?
+                    ORDER BY attempted_at
+                    """,
+                    (client,),
+                )
+            ]
+            if len(recent) >= self.max_failures:
+                expires = recent[len(recent) - self.max_failures] + self.window_seconds
+                raise LoginThrottledError(max(1, math.ceil(expires - now)))
+            cursor = conn.execute(
+                "INSERT INTO login_attempt (client, attempted_at) VALUES (?, ?)",
+                (client, now),
+            )
+        return int(cursor.lastrowid)
+
+    def cancel(self, attempt: int) -> None:
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM login_attempt WHERE id = ?", (attempt,))
+
+    def reset(self, client: str) -> None:
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM login_attempt WHERE client = ?", (client,))
+
+
+class PasswordVerifier:
+    # A concurrency cap, not a way to free request threads: the calling
+    # thread still waits for its hash, but at most `concurrency` hashes run
+    # at once and at most `queue` more wait, so a burst cannot take over
+    # every request thread or CPU core.
+    def __init__(self, concurrency: int, queue: int) -> None:
+        self.concurrency = concurrency
+        self.queue = queue
+        self._slots = threading.BoundedSemaphore(concurrency + queue)
+        self._executor: ThreadPoolExecutor | None = None
+        self._lock = threading.Lock()
+        self._stats = {"verified": 0, "rejected_busy": 0, "timed_out": 0}
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.concurrency,
+                        thread_name_prefix="habit-log-login",
+                    )
+        return self._executor
+
+    def run(self, verify: Callable[..., T], *args: object) -> T:
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._stats["rejected_busy"] += 1
+            raise LoginBusyError("Too many login attempts in progress.")
+        try:
+            future = self._get_executor().submit(verify, *args)
+            result = future.result(timeout=LOGIN_TIMEOUT_SECONDS)
+        except FutureTimeoutError as exc:
+            future.cancel()
+            with self._lock:
+                self._stats["timed_out"] += 1
+            raise LoginBusyError("Password verification timed out.") from exc
+        finally:
+            self._slots.release()
+        with self._lock:
+            self._stats["verified"] += 1
+        return result
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "concurrency": self.concurrency,
+                "queue": self.queue,
+                **self._stats,
+            }
@@ -0,0 +1,282 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from contextvars import ContextVar
+from functools import wraps
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, Mapping, TypeVar
+
+from flask import Flask, Response, g, request
+from flask.signals import before_render_template, template_rendered
+
+T = TypeVar("T")
+
+MULTIPROCESS_ENV = "PROMETHEUS_MULTIPROC_DIR"
+METRICS_DIRNAME = "metrics"
+LATENCY_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+QUERY_LATENCY_BUCKETS = (
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    1.0,
+)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 4, 8, 16, 32, 64, 128)
+UNMATCHED_ENDPOINT = "unmatched"
+
+
+class _Metrics:
+    def __init__(self) -> None:
+        from prometheus_client import CollectorRegistry, Counter, Histogram
+
+        self.registry = CollectorRegistry()
+        self.requests = Counter(
+            "habit_log_requests",
+            "HTTP requests by endpoint, method and status.",
+            ("endpoint", "method", "status"),
+            registry=self.registry,
+        )
+        self.request_seconds = Histogram(
+            "habit_log_request_duration_seconds",
+            "Time spent handling a request, from routing to the response.",
+            ("endpoint", "method"),
+            buckets=LATENCY_BUCKETS,
+            registry=self.registry,
+        )
+        self.request_db_queries = Histogram(
+            "habit_log_request_db_queries",
+            "Database calls made while handling a request.",
+            ("endpoint",),
+            buckets=QUERY_COUNT_BUCKETS,
+            registry=self.registry,
+        )
+        self.request_db_seconds = Histogram(
+            "habit_log_request_db_seconds",
+            "Time spent in database calls while handling a request.",
+            ("endpoint",),
+            buckets=LATENCY_BUCKETS,
+            registry=self.registry,
+        )
+        self.db_call_seconds = Histogram(
+            "habit_log_db_call_duration_seconds",
+            "Time spent in each db.py function.",
+            ("function",),
+            buckets=QUERY_LATENCY_BUCKETS,
+            registry=self.registry,
+        )
+        self.template_seconds = Histogram(
+            "habit_log_template_render_seconds",
+            "Time spent rendering each template.",
+            ("template",),
+            buckets=LATENCY_BUCKETS,
+            registry=self.registry,
+        )
+
+
+_METRICS: _Metrics | None = None
+_METRICS_LOCK = threading.Lock()
+_REQUEST_DB: ContextVar[list[float] | None] = ContextVar(
+    "habit_log_request_db", default=None
+)
+_TIMING = threading.local()
+
+
+def get_multiprocess_dir() -> Path | None:
+    value = os.environ.get(MULTIPROCESS_ENV)
+    return Path(value) if value else None
+
+
+def _configure_multiprocess() -> None:
+    # prometheus_client picks its value storage when it is first imported, so
+    # gunicorn workers must see the shared directory before that happens.
+    from .config import get_data_dir, get_settings
+
+    if get_multiprocess_dir() is not None:
+        return
+    if get_settings().server_mode != "production":
+        return
+    os.environ[MULTIPROCESS_ENV] = str(get_data_dir() / METRICS_DIRNAME)
+
+
+def _init_metrics() -> _Metrics:
+    global _METRICS
+    with _METRICS_LOCK:
+        if _METRICS is None:
+            _configure_multiprocess()
+            directory = get_multiprocess_dir()
+            if directory is not None:
+                directory.mkdir(parents=True, exist_ok=True)
+            _METRICS = _Metrics()
+        return _METRICS
+
+
+def reset_multiprocess_dir() -> None:
+    directory = get_multiprocess_dir()
+    if directory is None or not directory.is_dir():
+        return
+    for path in directory.glob("*.db"):
+        path.unlink(missing_ok=True)
+
+
+def mark_process_dead(pid: int) -> None:
+    if get_multiprocess_dir() is None:
+        return
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(pid)
+
+
+def timed(func: Callable[..., T]) -> Callable[..., T]:
+    name = func.__name__
+
+    @wraps(func)
+    def wrapped(*args, **kwargs):
+        metrics = _METRICS
+        if metrics is None or getattr(_TIMING, "active", False):
+            return func(*args, **kwargs)
+        _TIMING.active = True
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - started
+            _TIMING.active = False
+            metrics.db_call_seconds.labels(name).observe(elapsed)
+            request_db = _REQUEST_DB.get()
+            if request_db is not None:
+                request_db[0] += 1
+                request_db[1] += elapsed
+
+    return wrapped
+
+
+class _StatsCollector:
+    def __init__(
+        self, gauges: Iterable[tuple[str, Callable[[], Mapping[str, object]]]]
+    ) -> None:
+        self.gauges = tuple(gauges)
+
+    def collect(self) -> Iterator[object]:
+        from prometheus_client.core import GaugeMetricFamily
+
+        pid = str(os.getpid())
+        for prefix, collect in self.gauges:
+            for key, value in sorted(collect().items()):
+                if isinstance(value, bool):
+                    value = int(value)
+                if not isinstance(value, (int, float)):
+                    continue
+                family = GaugeMetricFamily(
+                    f"habit_log_{prefix}_{key}",
+                    f"{prefix} {key} in the worker that answered the scrape.",
+                    labels=("pid",),
+                )
+                family.add_metric((pid,), value)
+                yield family
+
+
+def render_metrics(
+    gauges: Iterable[tuple[str, Callable[[], Mapping[str, object]]]] = (),
+) -> bytes:
+    from prometheus_client import CollectorRegistry, generate_latest
+
+    metrics = _init_metrics()
+    if get_multiprocess_dir() is not None:
+        from prometheus_client import multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = metrics.registry
+    stats = CollectorRegistry()
+    stats.register(_StatsCollector(gauges))
+    return generate_latest(registry) + generate_latest(stats)
+
+
+def _endpoint() -> str:
+    return request.endpoint or UNMATCHED_ENDPOINT
+
+
+def register_metrics(
+    app: Flask,
+    gauges: Iterable[tuple[str, Callable[[], Mapping[str, object]]]] = (),
+) -> None:
+    from .config import get_settings
+
+    if not get_settings().metrics_enabled:
+        return
+    metrics = _init_metrics()
+    gauges = tuple(gauges)
+
+    @app.before_request
+    def _start_request_timer() -> None:
+        g.habit_log_metrics = (
+            time.perf_counter(),
+            _REQUEST_DB.set([0, 0.0]),
+        )
+
+    @app.after_request
+    def _record_status(response: Response) -> Response:
+        g.habit_log_status = response.status_code
+        return response
+
+    @app.teardown_request
+    def _record_request(exc: BaseException | None) -> None:
+        timer = g.pop("habit_log_metrics", None)
+        if timer is None:
+            return
+        started, token = timer
+        elapsed = time.perf_counter() - started
+        request_db = _REQUEST_DB.get() or [0, 0.0]
+        _REQUEST_DB.reset(token)
+        endpoint = _endpoint()
+        status = g.pop("habit_log_status", 500)
+        metrics.requests.labels(endpoint, request.method, str(status)).inc()
+        metrics.request_seconds.labels(endpoint, request.method).observe(elapsed)
+        metrics.request_db_queries.labels(endpoint).observe(request_db[0])
+        metrics.request_db_seconds.labels(endpoint).observe(request_db[1])
+
+    def _start_template_timer(sender, template, context, **extra) -> None:
+        stack = getattr(_TIMING, "templates", None)
+        if stack is None:
+            stack = _TIMING.templates = []
+        stack.append(time.perf_counter())
+
+    def _record_template(sender, template, context, **extra) -> None:
+        stack = getattr(_TIMING, "templates", None)
+        if not stack:
+            return
+        elapsed = time.perf_counter() - stack.pop()
+        metrics.template_seconds.labels(template.name or "<string>").observe(elapsed)
+
+    before_render_template.connect(_start_template_timer, app, weak=False)
+    template_rendered.connect(_record_template, app, weak=False)
+
+    @app.get("/metrics", endpoint="metrics")
+    def metrics_view() -> Response:
+        from prometheus_client import CONTENT_TYPE_LATEST
+
+        return Response(render_metrics(gauges), content_type=CONTENT_TYPE_LATEST)
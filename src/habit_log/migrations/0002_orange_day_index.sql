@@ -0,0 +1,33 @@
+CREATE TABLE orange_day (
+    date                DATE        PRIMARY KEY
+) WITHOUT ROWID;
+
+INSERT INTO orange_day (date)
+SELECT date
+FROM daily_log
+WHERE special_occasion = 1
+  AND (walked = 0 OR no_alcohol_after_21 = 0 OR food_respected = 0);
+
+CREATE TRIGGER daily_log_orange_insert
+AFTER INSERT ON daily_log
+WHEN NEW.special_occasion = 1
+  AND (NEW.walked = 0 OR NEW.no_alcohol_after_21 = 0 OR NEW.food_respected = 0)
+BEGIN
+    INSERT OR IGNORE INTO orange_day (date) VALUES (NEW.date);
+END;
+
+CREATE TRIGGER daily_log_orange_update
+AFTER UPDATE ON daily_log
+BEGIN
+    DELETE FROM orange_day WHERE date = OLD.date;
+    INSERT OR IGNORE INTO orange_day (date)
+    SELECT NEW.date
+    WHERE NEW.special_occasion = 1
+      AND (NEW.walked = 0 OR NEW.no_alcohol_after_21 = 0 OR NEW.food_respected = 0);
+END;
+
+CREATE TRIGGER daily_log_orange_delete
+AFTER DELETE ON daily_log
+BEGIN
+    DELETE FROM orange_day WHERE date = OLD.date;
+END;
@@ -0,0 +1 @@
+CREATE INDEX daily_log_updated_at_idx ON daily_log (updated_at, date);
@@ -0,0 +1,7 @@
+ALTER TABLE daily_log ADD COLUMN habit_mask INTEGER
+    GENERATED ALWAYS AS (
+        walked
+        | (no_alcohol_after_21 << 1)
+        | (food_respected << 2)
+        | (special_occasion << 3)
+    ) VIRTUAL;
@@ -0,0 +1,43 @@
+CREATE TABLE change_counter (
+    name                TEXT        PRIMARY KEY,
+    revision            INTEGER     NOT NULL
+) WITHOUT ROWID;
+
+INSERT INTO change_counter (name, revision)
+VALUES ('daily_log', 0), ('weekly_weight', 0);
+
+CREATE TRIGGER daily_log_change_insert
+AFTER INSERT ON daily_log
+BEGIN
+    UPDATE change_counter SET revision = revision + 1 WHERE name = 'daily_log';
+END;
+
+CREATE TRIGGER daily_log_change_update
+AFTER UPDATE ON daily_log
+BEGIN
+    UPDATE change_counter SET revision = revision + 1 WHERE name = 'daily_log';
+END;
+
+CREATE TRIGGER daily_log_change_delete
+AFTER DELETE ON daily_log
+BEGIN
+    UPDATE change_counter SET revision = revision + 1 WHERE name = 'daily_log';
+END;
+
+CREATE TRIGGER weekly_weight_change_insert
+AFTER INSERT ON weekly_weight
+BEGIN
+    UPDATE change_counter SET revision = revision + 1 WHERE name = 'weekly_weight';
+END;
+
+CREATE TRIGGER weekly_weight_change_update
+AFTER UPDATE ON weekly_weight
+BEGIN
+    UPDATE change_counter SET revision = revision + 1 WHERE name = 'weekly_weight';
+END;
+
+CREATE TRIGGER weekly_weight_change_delete
+AFTER DELETE ON weekly_weight
+BEGIN
+    UPDATE change_counter SET revision = revision + 1 WHERE name = 'weekly_weight';
+END;
@@ -0,0 +1,6 @@
+ALTER TABLE weekly_weight ADD COLUMN updated_at TEXT NOT NULL DEFAULT '';
+
+UPDATE weekly_weight SET updated_at = created_at;
+
+CREATE INDEX weekly_weight_updated_at_idx
+ON weekly_weight (updated_at, year, week);
@@ -0,0 +1,334 @@
+from __future__ import annotations
+
+import cProfile
+import json
+import logging
+import os
+import pstats
+import random
+import re
+import threading
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+from flask import Flask, g, has_request_context, request
+
+from .config import get_data_dir
+from .db import set_statement_tracer
+
+CONTROL_FILENAME = "profiling.json"
+PROFILES_DIRNAME = "profiles"
+CONTROL_CHECK_SECONDS = 2.0
+DEFAULT_SAMPLE_RATE = 0.05
+DEFAULT_SLOW_QUERY_MS = 50.0
+DEFAULT_PROFILE_MINUTES = 30
+MAX_PROFILE_FILES = 200
+MIN_FOLDED_MICROSECONDS = 1
+MAX_FOLDED_DEPTH = 128
+
+logger = logging.getLogger(__name__)
+
+
+class ProfilerError(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class ProfilerState:
+    sample_rate: float = DEFAULT_SAMPLE_RATE
+    slow_query_ms: float = DEFAULT_SLOW_QUERY_MS
+    endpoints: tuple[str, ...] = ()
+    until: float | None = None
+
+    def is_active(self, now: float) -> bool:
+        return self.until is None or now < self.until
+
+    def snapshot(self) -> dict[str, object]:
+        values = asdict(self)
+        values["endpoints"] = list(self.endpoints)
+        return values
+
+
+def get_control_path() -> Path:
+    return get_data_dir() / CONTROL_FILENAME
+
+
+def get_profiles_dir() -> Path:
+    return get_data_dir() / PROFILES_DIRNAME
+
+
+def _parse_state(values: dict[str, object]) -> ProfilerState:
+    try:
+        sample_rate = float(values.get("sample_rate", DEFAULT_SAMPLE_RATE))
+        slow_query_ms = float(values.get("slow_query_ms", DEFAULT_SLOW_QUERY_MS))
+        until = values.get("until")
+        until = float(until) if until is not None else None
+    except (TypeError, ValueError) as exc:
+        raise ProfilerError(f"Invalid profiler settings: {exc}") from exc
+    if not 0 <= sample_rate <= 1:
+        raise ProfilerError("sample_rate must be between 0 and 1.")
+    if slow_query_ms < 0:
+        raise ProfilerError("slow_query_ms must not be negative.")
+    endpoints = values.get("endpoints") or ()
+    if isinstance(endpoints, str) or not all(
+        isinstance(endpoint, str) for endpoint in endpoints
+    ):
+        raise ProfilerError("endpoints must be a list of endpoint names.")
+    return ProfilerState(sample_rate, slow_query_ms, tuple(endpoints), until)
+
+
+def enable_profiling(
+    *,
+    sample_rate: float = DEFAULT_SAMPLE_RATE,
+    slow_query_ms: float = DEFAULT_SLOW_QUERY_MS,
+    endpoints: tuple[str, ...] = (),
+    minutes: float | None = DEFAULT_PROFILE_MINUTES,
+) -> ProfilerState:
+    state = _parse_state(
+        {
+            "sample_rate": sample_rate,
+            "slow_query_ms": slow_query_ms,
+            "endpoints": list(endpoints),
+            "until": time.time() + minutes * 60 if minutes else None,
+        }
+    )
+    path = get_control_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temporary = path.with_suffix(".tmp")
+    temporary.write_text(json.dumps(state.snapshot()) + "\n", encoding="utf-8")
+    os.replace(temporary, path)
+    return state
+
+
+def disable_profiling() -> bool:
+    try:
+        get_control_path().unlink()
+    except FileNotFoundError:
+        return False
+    return True
+
+
+def read_profiling_state() -> ProfilerState | None:
+    try:
+        text = get_control_path().read_text(encoding="utf-8")
+    except FileNotFoundError:
+        return None
+    try:
+        values = json.loads(text)
+    except ValueError as exc:
+        raise ProfilerError(f"{CONTROL_FILENAME} is not valid JSON.") from exc
+    if not isinstance(values, dict):
+        raise ProfilerError(f"{CONTROL_FILENAME} must hold a JSON object.")
+    return _parse_state(values)
+
+
+class SlowQueryLog:
+    def __init__(self, threshold_ms: float) -> None:
+        self.threshold = threshold_ms / 1000
+        self._local = threading.local()
+
+    def trace(self, statement: str) -> None:
+        pending = getattr(self._local, "pending", None)
+        if pending is not None and pending[0] == statement:
+            # Triggers report their enclosing statement again; keep one timer.
+            return
+        now = time.perf_counter()
+        self._report(now)
+        self._local.pending = (statement, now)
+
+    def flush(self) -> None:
+        self._report(time.perf_counter())
+        self._local.pending = None
+
+    def _report(self, now: float) -> None:
+        # A statement is timed from its trace callback until the next statement
+        # on the same thread starts or the db.py call releases the connection.
+        pending = getattr(self._local, "pending", None)
+        if pending is None:
+            return
+        statement, started = pending
+        elapsed = now - started
+        if elapsed >= self.threshold:
+            logger.warning(
+                "slow query %.1f ms [%s]: %s",
+                elapsed * 1000,
+                request.endpoint if has_request_context() else None,
+                " ".join(statement.split()),
+            )
+
+
+def _function_label(func: tuple[str, int, str]) -> str:
+    filename, line, name = func
+    if filename == "~":
+        return name
+    return f"{Path(filename).name}:{line}:{name}"
+
+
+def iter_folded_stacks(stats: pstats.Stats) -> list[str]:
+    # cProfile only keeps caller -> callee edges, so stacks are rebuilt by
+    # splitting each function's time across its callers in proportion.
+    entries = stats.stats
+    callees: dict[tuple, list[tuple]] = {}
+    roots = []
+    for func, (_, _, _, _, callers) in entries.items():
+        if not callers:
+            roots.append(func)
+        for caller in callers:
+            callees.setdefault(caller, []).append(func)
+
+    folded: dict[str, int] = {}
+
+    def walk(func: tuple, path: tuple[str, ...], share: float) -> None:
+        _, _, inline, cumulative, _ = entries[func]
+        path = path + (_function_label(func),)
+        own = round(inline * share * 1_000_000)
+        if own >= MIN_FOLDED_MICROSECONDS:
+            key = ";".join(path)
+            folded[key] = folded.get(key, 0) + own
+        if len(path) >= MAX_FOLDED_DEPTH:
+            return
+        for callee in callees.get(func, ()):
+            if _function_label(callee) in path:
+                continue
+            callee_cumulative = entries[callee][3]
+            edge_cumulative = entries[callee][4][func][3]
+            if not callee_cumulative:
+                continue
+            child_share = share * edge_cumulative / callee_cumulative
+            if child_share * callee_cumulative * 1_000_000 >= (
+                MIN_FOLDED_MICROSECONDS
+            ):
+                walk(callee, path, child_share)
+
+    for root in roots:
+        walk(root, (), 1.0)
+    return [f"{stack} {count}" for stack, count in sorted(folded.items())]
+
+
+def _prune_profiles(directory: Path) -> None:
+    profiles = sorted(directory.glob("*.prof"), key=lambda path: path.stat().st_mtime)
+    for stale in profiles[: max(0, len(profiles) - MAX_PROFILE_FILES)]:
+        stale.unlink(missing_ok=True)
+        stale.with_suffix(".folded").unlink(missing_ok=True)
+
+
+def dump_profile(profile: cProfile.Profile, endpoint: str, elapsed: float) -> Path:
+    directory = get_profiles_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    stamp = time.strftime("%Y%m%dT%H%M%S", time.gmtime())
+    name = re.sub(r"[^\w.-]", "_", endpoint)
+    path = directory / f"{stamp}-{name}-{round(elapsed * 1000)}ms-{os.getpid()}.prof"
+    profile.dump_stats(path)
+    folded = iter_folded_stacks(pstats.Stats(profile))
+    path.with_suffix(".folded").write_text(
+        "\n".join(folded) + "\n", encoding="utf-8"
+    )
+    _prune_profiles(directory)
+    return path
+
+
+class RequestProfiler:
+    def __init__(self) -> None:
+        self._state: ProfilerState | None = None
+        self._slow_queries: SlowQueryLog | None = None
+        self._checked_at = 0.0
+        self._control_mtime: float | None = None
+        self._lock = threading.Lock()
+        self._profiling = threading.Lock()
+
+    def current(self) -> ProfilerState | None:
+        now = time.monotonic()
+        if now - self._checked_at >= CONTROL_CHECK_SECONDS:
+            with self._lock:
+                if now - self._checked_at >= CONTROL_CHECK_SECONDS:
+                    self._checked_at = now
+                    self._reload()
+        state = self._state
+        if state is not None and not state.is_active(time.time()):
+            with self._lock:
+                if self._state is state:
+                    self._apply(None)
+            return None
+        return state
+
+    def _reload(self) -> None:
+        try:
+            mtime = get_control_path().stat().st_mtime
+        except (FileNotFoundError, RuntimeError):
+            mtime = None
+        if mtime == self._control_mtime:
+            return
+        self._control_mtime = mtime
+        try:
+            state = read_profiling_state() if mtime is not None else None
+        except ProfilerError as exc:
+            logger.warning("profiling disabled: %s", exc)
+            state = None
+        self._apply(state)
+
+    def _apply(self, state: ProfilerState | None) -> None:
+        previous = self._state
+        self._state = state
+        threshold = state.slow_query_ms if state is not None else None
+        if previous is not None and previous.slow_query_ms == threshold:
+            return
+        if threshold is None:
+            set_statement_tracer(None)
+            self._slow_queries = None
+        else:
+            self._slow_queries = SlowQueryLog(threshold)
+            set_statement_tracer(self._slow_queries.trace, self._slow_queries.flush)
+        logger.warning(
+            "profiling %s",
+            json.dumps(state.snapshot()) if state is not None else "disabled",
+        )
+
+    def start(self, endpoint: str | None) -> cProfile.Profile | None:
+        state = self.current()
+        if state is None or not state.sample_rate:
+            return None
+        if state.endpoints and endpoint not in state.endpoints:
+            return None
+        if random.random() >= state.sample_rate:
+            return None
+        # Only one request is profiled at a time; overlapping profilers would
+        # slow each other down and mix their stacks.
+        if not self._profiling.acquire(blocking=False):
+            return None
+        profile = cProfile.Profile()
+        profile.enable()
+        return profile
+
+    def finish(self, profile: cProfile.Profile, endpoint: str, elapsed: float) -> None:
+        try:
+            profile.disable()
+            path = dump_profile(profile, endpoint, elapsed)
+        except OSError as exc:
+            logger.warning("could not write profile: %s", exc)
+            return
+        finally:
+            self._profiling.release()
+        logger.warning("profiled %s in %.1f ms: %s", endpoint, elapsed * 1000, path)
+
+
+def register_profiler(app: Flask) -> RequestProfiler:
+    profiler = RequestProfiler()
+    app.extensions["habit_log_profiler"] = profiler
+
+    @app.before_request
+    def _start_profile() -> None:
+        profile = profiler.start(request.endpoint)
+        if profile is not None:
+            g.habit_log_profile = (profile, time.perf_counter())
+
+    @app.teardown_request
+    def _finish_profile(exc: BaseException | None) -> None:
+        entry = g.pop("habit_log_profile", None)
+        if entry is None:
+            return
+        profile, started = entry
+        elapsed = time.perf_counter() - started
+        profiler.finish(profile, request.endpoint or "unmatched", elapsed)
+
+    return profiler
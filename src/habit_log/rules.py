@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import datetime as dt
+from bisect import bisect_left, bisect_right, insort
+from collections import Counter
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Iterable
+
+WEIGHT_MIN = Decimal("3")
+WEIGHT_MAX = Decimal("500")
+WEIGHT_QUANT = Decimal("0.1")
+WEIGHT_RANGE_ERROR = "Weight must be a number between 3.0 and 500.0 kg."
+
+ORANGE_DAYS_PER_WEEK = 2
+ORANGE_DAYS_PER_WINDOW = 5
+ORANGE_WINDOW_DAYS = 30
+ORANGE_WEEK_ERROR = "Only 2 orange days are allowed per ISO week."
+ORANGE_WINDOW_ERROR = "Only 5 orange days are allowed in any 30-day window."
+
+
+def normalize_weight(value: Decimal) -> Decimal:
+    return value.quantize(WEIGHT_QUANT, rounding=ROUND_HALF_UP)
+
+
+def is_weight_in_range(value: Decimal) -> bool:
+    return WEIGHT_MIN <= value <= WEIGHT_MAX
+
+
+def compute_day_status(
+    *,
+    walked: bool,
+    food_respected: bool,
+    no_alcohol_after_21: bool,
+    special_occasion: bool,
+) -> str:
+    if walked and food_respected and no_alcohol_after_21:
+        return "green"
+    if special_occasion:
+        return "orange"
+    return "red"
+
+
+def get_iso_week_bounds(day: dt.date) -> tuple[dt.date, dt.date]:
+    week = day.isocalendar()
+    start = dt.date.fromisocalendar(week.year, week.week, 1)
+    end = dt.date.fromisocalendar(week.year, week.week, 7)
+    return start, end
+
+
+def get_orange_window_start(day: dt.date) -> dt.date:
+    return day - dt.timedelta(days=ORANGE_WINDOW_DAYS - 1)
+
+
+def orange_quota_error(orange_week: int, orange_window: int) -> str | None:
+    if orange_week + 1 > ORANGE_DAYS_PER_WEEK:
+        return ORANGE_WEEK_ERROR
+    if orange_window + 1 > ORANGE_DAYS_PER_WINDOW:
+        return ORANGE_WINDOW_ERROR
+    return None
+
+
+class OrangeQuotaTracker:
+    def __init__(self, orange_days: Iterable[dt.date] = ()) -> None:
+        orange_days = list(orange_days)
+        self._ordinals: list[int] = sorted(day.toordinal() for day in orange_days)
+        self._weeks = Counter(day.isocalendar()[:2] for day in orange_days)
+
+    def check(self, day: dt.date) -> str | None:
+        ordinal = day.toordinal()
+        window_start = ordinal - (ORANGE_WINDOW_DAYS - 1)
+        orange_window = bisect_right(self._ordinals, ordinal) - bisect_left(
+            self._ordinals, window_start
+        )
+        return orange_quota_error(self._weeks[day.isocalendar()[:2]], orange_window)
+
+    def record(self, day: dt.date) -> None:
+        insort(self._ordinals, day.toordinal())
+        self._weeks[day.isocalendar()[:2]] += 1
+
+    def add(self, day: dt.date) -> str | None:
+        error = self.check(day)
+        if error is None:
+            self.record(day)
+        return error
@@ -0,0 +1,52 @@
+from __future__ import annotations
+
+from flask import Flask
+from gunicorn.app.base import BaseApplication
+
+from .config import get_settings
+from .db import close_pool
+from .metrics import mark_process_dead, reset_multiprocess_dir
+
+
+def _worker_exit(server, worker) -> None:
+    close_pool()
+
+
+def _child_exit(server, worker) -> None:
+    mark_process_dead(worker.pid)
+
+
+class HabitLogServer(BaseApplication):
+    def __init__(self, app: Flask, options: dict[str, object]) -> None:
+        self.application = app
+        self.options = options
+        super().__init__()
+
+    def load_config(self) -> None:
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self) -> Flask:
+        return self.application
+
+
+def get_server_options(host: str, port: int) -> dict[str, object]:
+    settings = get_settings()
+    return {
+        "bind": f"{host}:{port}",
+        "workers": settings.workers,
+        "threads": settings.threads,
+        "worker_class": "gthread" if settings.threads > 1 else "sync",
+        "keepalive": settings.keepalive_seconds,
+        "graceful_timeout": settings.graceful_timeout_seconds,
+        "preload_app": True,
+        "errorlog": "-",
+        "worker_exit": _worker_exit,
+        "child_exit": _child_exit,
+    }
+
+
+def serve(app: Flask, host: str, port: int) -> None:
+    # Metric files left by workers of a previous run would be summed in.
+    reset_multiprocess_dir()
+    HabitLogServer(app, get_server_options(host, port)).run()
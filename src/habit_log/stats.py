@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import datetime as dt
+import re
+from itertools import accumulate
+from operator import sub, truediv
+
+from .daystatus import (
+    FOOD_RESPECTED,
+    NO_ALCOHOL_AFTER_21,
+    PRESENT,
+    STATUS_GREEN,
+    STATUS_MISSING,
+    STATUS_ORANGE,
+    STATUS_RED,
+    WALKED,
+    DayStatusBitmap,
+)
+
+ROLLING_WINDOWS = (7, 30)
+HABIT_BITS = {
+    "walked": WALKED,
+    "no_alcohol_after_21": NO_ALCOHOL_AFTER_21,
+    "food_respected": FOOD_RESPECTED,
+}
+GREEN_RUN = re.compile(bytes((STATUS_GREEN,)) + b"+")
+IS_GREEN = bytes(int(status == STATUS_GREEN) for status in range(256))
+HABIT_TABLES = {
+    name: bytes(int(bool(mask & PRESENT and mask & bit)) for mask in range(256))
+    for name, bit in HABIT_BITS.items()
+}
+
+
+def _rate(numerator: int, denominator: int) -> float | None:
+    if denominator == 0:
+        return None
+    return round(numerator / denominator, 4)
+
+
+def _rolling_scores(green: bytes, window: int) -> list[float]:
+    prefix = list(accumulate(green, initial=0))
+    lagged = [0] * window + prefix[1 : len(prefix) - window]
+    divisors = list(range(1, window)) + [window] * max(len(green) - window + 1, 0)
+    totals = map(sub, prefix[1:], lagged)
+    return list(map(truediv, totals, divisors))
+
+
+def compute_stats(
+    bitmap: DayStatusBitmap,
+    as_of: dt.date,
+    *,
+    include_series: bool = False,
+) -> dict[str, object]:
+    first_day = bitmap.first_day if len(bitmap) else None
+    if first_day is None or as_of < first_day:
+        statuses = b""
+        masks = b""
+    else:
+        statuses = bitmap.statuses_between(first_day, as_of)
+        masks = bytes(bitmap.masks[: len(statuses)])
+
+    days_logged = len(statuses) - statuses.count(STATUS_MISSING)
+    green = statuses.translate(IS_GREEN)
+
+    streak_end = as_of
+    if bitmap.status(as_of) == STATUS_MISSING:
+        streak_end = as_of - dt.timedelta(days=1)
+
+    longest = {"length": 0, "start": None, "end": None}
+    for run in GREEN_RUN.finditer(statuses):
+        length = run.end() - run.start()
+        if length > longest["length"]:
+            longest = {
+                "length": length,
+                "start": (first_day + dt.timedelta(days=run.start())).isoformat(),
+                "end": (first_day + dt.timedelta(days=run.end() - 1)).isoformat(),
+            }
+
+    adherence = {
+        name: _rate(masks.translate(table).count(1), days_logged)
+        for name, table in HABIT_TABLES.items()
+    }
+    adherence["all_habits"] = _rate(statuses.count(STATUS_GREEN), days_logged)
+
+    rolling = {}
+    for window in ROLLING_WINDOWS:
+        # A window that starts before the first logged day only covers the
+        # days since then; dividing by the full window understates new users.
+        if first_day is None or as_of < first_day:
+            window_days = 0
+            window_green = 0
+        else:
+            window_start = max(as_of - dt.timedelta(days=window - 1), first_day)
+            window_days = (as_of - window_start).days + 1
+            window_green = bitmap.count(STATUS_GREEN, window_start, as_of)
+        rolling[str(window)] = {
+            "latest": _rate(window_green, window_days),
+            "days": window_days,
+        }
+        if include_series:
+            rolling[str(window)]["series"] = _rolling_scores(green, window)
+
+    return {
+        "as_of": as_of.isoformat(),
+        "first_day": first_day.isoformat() if first_day else None,
+        "days_tracked": len(statuses),
+        "days_logged": days_logged,
+        "current_streak": bitmap.streak_ending(streak_end),
+        "longest_streak": longest,
+        "status_counts": {
+            "green": statuses.count(STATUS_GREEN),
+            "orange": statuses.count(STATUS_ORANGE),
+            "red": statuses.count(STATUS_RED),
+            "missing": statuses.count(STATUS_MISSING),
+        },
+        "adherence": adherence,
+        "rolling": rolling,
+    }
@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import base64
+import binascii
+import datetime as dt
+import json
+
+from .db import get_sync_changes
+from .export import ExportError, parse_since
+
+DEFAULT_SYNC_PAGE_SIZE = 500
+MAX_SYNC_PAGE_SIZE = 5000
+SYNC_SETTLE_SECONDS = 2
+
+
+class SyncError(ValueError):
+    pass
+
+
+class SyncCursor:
+    def __init__(
+        self,
+        days: tuple[str, str] = ("", ""),
+        weights: tuple[str, int, int] = ("", 0, 0),
+    ) -> None:
+        self.days = days
+        self.weights = weights
+
+    @classmethod
+    def from_since(cls, since: str) -> SyncCursor:
+        return cls((since, ""), (since, 0, 0))
+
+    @classmethod
+    def decode(cls, token: str) -> SyncCursor:
+        try:
+            padded = token + "=" * (-len(token) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded))
+            days = (str(payload["d"][0]), str(payload["d"][1]))
+            weights = (
+                str(payload["w"][0]),
+                int(payload["w"][1]),
+                int(payload["w"][2]),
+            )
+        except (binascii.Error, ValueError, KeyError, IndexError, TypeError) as exc:
+            raise SyncError("cursor is not a valid sync cursor.") from exc
+        return cls(days, weights)
+
+    def encode(self) -> str:
+        payload = json.dumps(
+            {"d": list(self.days), "w": list(self.weights)}, separators=(",", ":")
+        )
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def parse_cursor(cursor: str | None, since: str | None) -> SyncCursor:
+    if cursor:
+        return SyncCursor.decode(cursor)
+    try:
+        since_value = parse_since(since)
+    except ExportError as exc:
+        raise SyncError(str(exc)) from exc
+    if since_value:
+        return SyncCursor.from_since(since_value)
+    return SyncCursor()
+
+
+def parse_limit(value: str | None) -> int:
+    if not value:
+        return DEFAULT_SYNC_PAGE_SIZE
+    try:
+        limit = int(value)
+    except ValueError as exc:
+        raise SyncError("limit must be an integer.") from exc
+    if not 1 <= limit <= MAX_SYNC_PAGE_SIZE:
+        raise SyncError(f"limit must be between 1 and {MAX_SYNC_PAGE_SIZE}.")
+    return limit
+
+
+def pull_changes(cursor: SyncCursor, limit: int) -> dict[str, object]:
+    now = dt.datetime.utcnow().replace(microsecond=0)
+    until = (now - dt.timedelta(seconds=SYNC_SETTLE_SECONDS)).isoformat()
+    days, weights, has_more = get_sync_changes(
+        cursor.days, cursor.weights, until=until, limit=limit
+    )
+    next_cursor = SyncCursor(
+        (days[-1]["updated_at"], days[-1]["date"]) if days else cursor.days,
+        (
+            (weights[-1]["updated_at"], weights[-1]["year"], weights[-1]["week"])
+            if weights
+            else cursor.weights
+        ),
+    )
+    return {
+        "days": days,
+        "weights": weights,
+        "cursor": next_cursor.encode(),
+        "has_more": has_more,
+        "server_time": now.isoformat(),
+    }
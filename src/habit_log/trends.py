@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import datetime as dt
+import threading
+from collections import OrderedDict
+from itertools import accumulate
+
+from .db import (
+    MAX_CACHED_SHARDS,
+    get_revision,
+    get_shard_key,
+    get_weekly_weights,
+    in_transaction,
+)
+
+MOVING_AVERAGE_WEEKS = (4, 12)
+
+
+def _week_start(year: int, week: int) -> dt.date:
+    return dt.date.fromisocalendar(year, week, 1)
+
+
+def _linear_trend(
+    weeks: list[int],
+    weights: list[float],
+) -> dict[str, object]:
+    count = len(weeks)
+    if count < 2:
+        return {"points": count, "slope_kg_per_week": None, "fitted_kg": None}
+
+    last_week = weeks[-1]
+    xs = [week - last_week for week in weeks]
+    mean_x = sum(xs) / count
+    mean_y = sum(weights) / count
+    variance = sum((x - mean_x) ** 2 for x in xs)
+    covariance = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, weights))
+    slope = covariance / variance
+    return {
+        "points": count,
+        "slope_kg_per_week": round(slope, 4),
+        "fitted_kg": round(mean_y - slope * mean_x, 2),
+    }
+
+
+def compute_weight_trend(rows: list[tuple[int, int, float]]) -> dict[str, object]:
+    starts = [_week_start(year, week) for year, week, _ in rows]
+    weeks = [start.toordinal() // 7 for start in starts]
+    weights = [weight for _, _, weight in rows]
+    prefix = list(accumulate(weights, initial=0.0))
+
+    moving_averages: dict[str, list[dict[str, object]]] = {}
+    trends: dict[str, dict[str, object]] = {}
+    for window in MOVING_AVERAGE_WEEKS:
+        series = []
+        lower = 0
+        for index, week in enumerate(weeks):
+            while weeks[lower] <= week - window:
+                lower += 1
+            average = (prefix[index + 1] - prefix[lower]) / (index + 1 - lower)
+            series.append(
+                {"week_start": starts[index].isoformat(), "kg": round(average, 2)}
+            )
+        moving_averages[str(window)] = series
+
+        if weeks:
+            first = next(
+                index for index, week in enumerate(weeks) if week > weeks[-1] - window
+            )
+        else:
+            first = 0
+        trends[str(window)] = _linear_trend(weeks[first:], weights[first:])
+    trends["all"] = _linear_trend(weeks, weights)
+
+    return {
+        "points": [
+            {
+                "year": year,
+                "week": week,
+                "week_start": start.isoformat(),
+                "kg": weight,
+            }
+            for (year, week, weight), start in zip(rows, starts)
+        ],
+        "moving_averages": moving_averages,
+        "trends": trends,
+    }
+
+
+_CACHE: OrderedDict[str, tuple[int, dict[str, object]]] = OrderedDict()
+_CACHE_LOCK = threading.Lock()
+
+
+def get_weight_trend() -> dict[str, object]:
+    if in_transaction():
+        return compute_weight_trend(get_weekly_weights())
+
+    shard = get_shard_key()
+    revision = get_revision("weekly_weight")
+    cached = _CACHE.get(shard)
+    if cached is not None and cached[0] == revision:
+        return cached[1]
+    with _CACHE_LOCK:
+        cached = _CACHE.get(shard)
+        if cached is not None and cached[0] == revision:
+            return cached[1]
+        trend = compute_weight_trend(get_weekly_weights())
+        _CACHE[shard] = (revision, trend)
+        _CACHE.move_to_end(shard)
+        while len(_CACHE) > MAX_CACHED_SHARDS:
+            _CACHE.popitem(last=False)
+        return trend